@@ -1,17 +1,55 @@
 import warnings
 warnings.filterwarnings('ignore')
 
+import math
 import os
 import time
-import easyocr
+from easyocr_engine import (EASYOCR_LANGUAGES, SECOND_PASS_SKIPPED, build_readers, needs_second_pass,
+                            readtext_cached, readtext_shared, recognize_regions)
+from ocr_cache import OCRCache, hash_file
+from resolution import resolution_variant
+from run_manifest import MANIFEST_FILENAME, RunManifest
+from run_metrics import CONFIDENCE_BUCKETS, RunMetrics
+import numpy as np
 from PIL import Image, ImageFilter
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as ExcelImage
+from excel_export import ExcelResultsWriter
 from tqdm import tqdm  # Import tqdm for progress bar
-from spellchecker import SpellChecker
+from spell_index import get_spell_index
 import string
 import re
 
+# Only OCR the sharpened image when the original pass found no text, its average confidence is below
+# SECOND_PASS_MIN_CONFIDENCE or more than SECOND_PASS_MAX_SPELL_ERROR_RATE of its words are misspelled
+# (False always runs both passes)
+GATED_SECOND_PASS = False
+SECOND_PASS_MIN_CONFIDENCE = 0.6
+SECOND_PASS_MAX_SPELL_ERROR_RATE = 0.2
+
+# Sharpen and re-read only the text boxes found on the original image in the sharpened pass, instead of
+# sharpening the whole image and detecting text again (images where the original pass found nothing
+# still get the full-image pass)
+SHARPEN_REGIONS_ONLY = True
+
+# Domain vocabulary merged into the English spell checking index (see spell_index.py), e.g.
+# ['Fentanyl_Precursors_All.xls'] for its substance names, synonyms and CAS numbers
+SPELL_DOMAIN_FILES = []
+
+# Resolution profile applied before OCR (see resolution.py): 'easyocr' scales huge photos down and tiny
+# crops up, with text boxes mapped back to the original image; None OCRs images at their own size
+RESOLUTION_PROFILE = None
+
+# Seconds between the live metrics snapshots written to ocr_metrics.json / .prom in the image directory
+# while a run is going (see run_metrics.py; None only writes them at the end)
+METRICS_EXPORT_INTERVAL = 30
+METRICS_FILENAME = 'ocr_metrics'
+
+# Stream rows to write-only workbooks as images are processed (recommended for very large folders)
+STREAMING_EXPORT = False
+
+# How images go into the Excel sheet: 'thumbnail' (small in-memory JPEGs at the displayed size),
+# 'embed' (the full-resolution files) or 'link' (hyperlinks to the original files)
+EXCEL_IMAGE_MODE = 'thumbnail'
+
 # Preprocessing function to clean and prepare words for spell checking
 def preprocess_words(text):
     # Remove punctuation using regex
@@ -29,40 +67,277 @@ def extract_mandarin_text(text):
     mandarin_characters = re.findall(r'[\u4e00-\u9fff]+', text)
     return ' '.join(mandarin_characters)
 
+# Engine and preprocessing settings recorded with every checkpoint; changing them redoes the images
+OCR_SETTINGS = {'engine': 'easyocr', 'languages': EASYOCR_LANGUAGES,
+                'variants': ['original', 'pil_sharpen_regions' if SHARPEN_REGIONS_ONLY else 'pil_sharpen'],
+                'second_pass': {'min_confidence': SECOND_PASS_MIN_CONFIDENCE,
+                                'max_spell_error_rate': SECOND_PASS_MAX_SPELL_ERROR_RATE}
+                if GATED_SECOND_PASS else 'always',
+                'resolution_profile': RESOLUTION_PROFILE, 'spell_domain_files': SPELL_DOMAIN_FILES}
+
+# Per-image statistics that extract_text_from_images adds up over the whole run
+STAT_COUNTERS = ('total_images', 'images_with_text', 'images_without_text', 'failed_extractions',
+                 'low_confidence_count', 'spell_errors_count', 'total_extracted_elements',
+                 'sharpened_low_confidence_count', 'sharpened_spell_errors_count',
+                 'total_sharpened_extracted_elements', 'total_confidence', 'total_sharpened_confidence',
+                 'second_passes_skipped')
+STAT_TEXTS = ('english_texts', 'mandarin_texts', 'original_texts')
+# Per-element confidences, recorded in the run's confidence histograms
+STAT_DISTRIBUTIONS = ('confidences', 'sharpened_confidences')
+
+# Function to start an image's statistics: zero counters, empty lists and no stage timings yet
+def new_image_stats():
+    stats = dict.fromkeys(STAT_COUNTERS, 0)
+    stats.update({name: [] for name in STAT_TEXTS + STAT_DISTRIBUTIONS})
+    stats['stage_seconds'] = {}
+    stats['total_images'] = 1
+    return stats
+
+# Function to sharpen only the given text boxes of an image, returning it as an RGB array
+def sharpen_regions(file_path, boxes):
+    with Image.open(file_path) as img:
+        original = img.convert('RGB')
+    sharpened = original.copy()
+
+    for box in boxes:
+        xs = [x for x, _ in box]
+        ys = [y for _, y in box]
+        inner = (max(0, math.floor(min(xs))), max(0, math.floor(min(ys))),
+                 min(original.width, math.ceil(max(xs))), min(original.height, math.ceil(max(ys))))
+        if inner[0] >= inner[2] or inner[1] >= inner[3]:
+            continue
+        # Sharpen a crop one pixel larger than the box, so the 3x3 SHARPEN kernel sees the same
+        # neighbours as on the whole image, then paste back just the box
+        outer = (max(0, inner[0] - 1), max(0, inner[1] - 1),
+                 min(original.width, inner[2] + 1), min(original.height, inner[3] + 1))
+        region = original.crop(outer).filter(ImageFilter.SHARPEN)
+        region = region.crop((inner[0] - outer[0], inner[1] - outer[1], inner[2] - outer[0], inner[3] - outer[1]))
+        sharpened.paste(region, inner[:2])
+
+    return np.array(sharpened)
+
+# Function to OCR one image (original and sharpened) and return its data and statistics
+# (with gated=True the sharpened pass only runs when the original pass needs it; with regions_only=True
+# it only re-reads the original pass's text boxes; profile normalizes the image resolution before OCR)
+def process_image(reader_simplified, reader_traditional, spell, file_path, cache=None, gated=False, profile=None,
+                  regions_only=False):
+    # Initialize data dictionary for this image
+    image_data = {
+        'file_path': file_path,
+        'filename': os.path.basename(file_path),
+    }
+    stats = new_image_stats()
+
+    # Function to run one stage of the processing, adding its time to the image's stage timings
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            stats['stage_seconds'][stage] = stats['stage_seconds'].get(stage, 0) + time.perf_counter() - start
+
+    # Open and read the image using EasyOCR
+    try:
+        # Process original image
+        # Try using the Simplified Chinese reader first, then the Traditional Chinese
+        # reader on the same detected text boxes if no text is found
+        image_hash = timed('hash', hash_file, file_path) if cache is not None else None
+        results = timed('original_pass', readtext_cached, cache, image_hash, resolution_variant('original', profile),
+                        lambda: readtext_shared(reader_simplified, reader_traditional, file_path, profile))
+
+        if results:
+            stats['images_with_text'] = 1  # Text was found
+            stats['total_extracted_elements'] = len(results)  # Count extracted elements
+            extracted_text = ' '.join([res[1] for res in results])
+
+            # Calculate average confidence
+            confidences = [float(res[2]) for res in results]
+            avg_confidence = sum(confidences) / len(confidences)
+            stats['total_confidence'] = avg_confidence
+            stats['confidences'] = confidences
+
+            # Count low confidence text elements
+            low_confidence_elements = [c for c in confidences if c < 0.5]
+            stats['low_confidence_count'] = len(low_confidence_elements)
+
+            # Determine verification status based on average confidence
+            verification_status = "Low Confidence" if avg_confidence < 0.6 else "Verified"
+
+            # Spell Checking for English Text
+            misspelled_words = []
+            detected_language = 'en'  # Default language since we are focusing on English
+            if detected_language == 'en':
+                words = preprocess_words(extracted_text)
+                misspelled = timed('spell_check', spell.unknown, words)
+                if misspelled:
+                    misspelled_words = list(misspelled)
+                    stats['spell_errors_count'] = len(misspelled)
+                    verification_status += f" | {len(misspelled)} Spell Errors"
+
+            # Collect English and Mandarin texts
+            english_text = extract_english_text(extracted_text)
+            if english_text:
+                stats['original_texts'].append(extracted_text)
+            mandarin_text = extract_mandarin_text(extracted_text)
+            if mandarin_text:
+                stats['mandarin_texts'].append(mandarin_text)
+
+        else:
+            stats['images_without_text'] = 1  # No text found
+            extracted_text = "No text found"
+            avg_confidence = 0
+            verification_status = "No Text"
+            misspelled_words = []
+
+        # Add data to image_data dictionary
+        image_data['extracted_text'] = extracted_text
+        image_data['avg_confidence'] = avg_confidence
+        image_data['verification_status'] = verification_status
+        image_data['misspelled_words'] = ', '.join(misspelled_words)
+
+        # In gated mode, skip the sharpened pass when the original is confident and mostly spelled correctly
+        run_second_pass = True
+        if gated and results:
+            spell_error_rate = len(misspelled_words) / len(words) if words else 0.0
+            run_second_pass = needs_second_pass(confidences, SECOND_PASS_MIN_CONFIDENCE,
+                                                spell_error_rate, SECOND_PASS_MAX_SPELL_ERROR_RATE)
+
+        # Now process the sharpened image
+        # Open and sharpen the image in memory; EasyOCR reads NumPy arrays directly,
+        # so nothing is written to (or re-decoded from) the image directory
+        def read_sharpened():
+            with Image.open(file_path) as img:
+                sharpened_img = img.convert('RGB').filter(ImageFilter.SHARPEN)
+            return readtext_shared(reader_simplified, reader_traditional, np.array(sharpened_img), profile)
+
+        # Re-read just the original pass's text boxes, sharpened, without running detection again
+        def read_sharpened_regions():
+            boxes = [res[0] for res in results]
+            return recognize_regions(reader_simplified, reader_traditional, sharpen_regions(file_path, boxes),
+                                     boxes, profile)
+
+        # Process the sharpened image (skipped entirely on a cache hit)
+        if run_second_pass and regions_only and results:
+            results_sharp = timed('sharpened_pass', readtext_cached, cache, image_hash,
+                                  resolution_variant('pil_sharpen_regions', profile), read_sharpened_regions)
+        elif run_second_pass:
+            results_sharp = timed('sharpened_pass', readtext_cached, cache, image_hash,
+                                  resolution_variant('pil_sharpen', profile), read_sharpened)
+        else:
+            results_sharp = None
+            stats['second_passes_skipped'] = 1
+
+        if results_sharp:
+            stats['total_sharpened_extracted_elements'] = len(results_sharp)
+            sharpened_extracted_text = ' '.join([res[1] for res in results_sharp])
+
+            # Calculate average confidence
+            sharpened_confidences = [float(res[2]) for res in results_sharp]
+            sharpened_avg_confidence = sum(sharpened_confidences) / len(sharpened_confidences)
+            stats['total_sharpened_confidence'] = sharpened_avg_confidence
+            stats['sharpened_confidences'] = sharpened_confidences
+
+            # Count low confidence text elements
+            sharpened_low_confidence_elements = [c for c in sharpened_confidences if c < 0.5]
+            stats['sharpened_low_confidence_count'] = len(sharpened_low_confidence_elements)
+
+            # Determine verification status based on average confidence
+            sharpened_verification_status = "Low Confidence" if sharpened_avg_confidence < 0.6 else "Verified"
+
+            # Spell Checking for English Text
+            sharpened_misspelled_words = []
+            detected_language = 'en'  # Default language since we are focusing on English
+            if detected_language == 'en':
+                words_sharp = preprocess_words(sharpened_extracted_text)
+                misspelled_sharp = timed('spell_check', spell.unknown, words_sharp)
+                if misspelled_sharp:
+                    sharpened_misspelled_words = list(misspelled_sharp)
+                    stats['sharpened_spell_errors_count'] = len(misspelled_sharp)
+                    sharpened_verification_status += f" | {len(misspelled_sharp)} Spell Errors"
+
+            # Collect English and Mandarin texts from sharpened images
+            english_text_sharp = extract_english_text(sharpened_extracted_text)
+            if english_text_sharp:
+                stats['english_texts'].append(english_text_sharp)
+            mandarin_text_sharp = extract_mandarin_text(sharpened_extracted_text)
+            if mandarin_text_sharp:
+                stats['mandarin_texts'].append(mandarin_text_sharp)
+
+        elif not run_second_pass:
+            sharpened_extracted_text = SECOND_PASS_SKIPPED
+            sharpened_avg_confidence = 0
+            sharpened_verification_status = "Skipped"
+            sharpened_misspelled_words = []
+            words_sharp = []
+
+        else:
+            sharpened_extracted_text = "No text found"
+            sharpened_avg_confidence = 0
+            sharpened_verification_status = "No Text"
+            sharpened_misspelled_words = []
+            words_sharp = []
+
+        # Add data to image_data dictionary
+        image_data['sharpened_extracted_text'] = sharpened_extracted_text
+        image_data['sharpened_avg_confidence'] = sharpened_avg_confidence
+        image_data['sharpened_verification_status'] = sharpened_verification_status
+        image_data['sharpened_misspelled_words'] = ', '.join(sharpened_misspelled_words)
+
+        # Get the sharpened extracted text without misspelled words
+        words_sharp_corrected = [word for word in words_sharp if word not in sharpened_misspelled_words]
+        sharpened_text_without_misspelled = ' '.join(words_sharp_corrected)
+        image_data['sharpened_text_without_misspelled'] = sharpened_text_without_misspelled
+
+        # Compare extracted_text and sharpened_extracted_text to find added and removed words
+        words_original = set(preprocess_words(extracted_text))
+        # (a skipped second pass has nothing to compare)
+        words_sharpened = set(preprocess_words(sharpened_extracted_text)) if run_second_pass else words_original
+        added_words = words_sharpened - words_original
+        removed_words = words_original - words_sharpened
+
+        image_data['added_words'] = ', '.join(added_words)
+        image_data['removed_words'] = ', '.join(removed_words)
+
+    except Exception as e:
+        # OCR failed: only the failure (and the time spent on it) is counted for this image
+        stage_seconds = stats['stage_seconds']
+        stats = new_image_stats()
+        stats['stage_seconds'] = stage_seconds
+        stats['failed_extractions'] = 1
+        print(f"Error processing {image_data['filename']}: {e}")
+        image_data['extracted_text'] = "Error in OCR"
+        image_data['avg_confidence'] = 0
+        image_data['verification_status'] = "Failed"
+        image_data['misspelled_words'] = ''
+        image_data['sharpened_extracted_text'] = "Error in OCR"
+        image_data['sharpened_avg_confidence'] = 0
+        image_data['sharpened_verification_status'] = "Failed"
+        image_data['sharpened_misspelled_words'] = ''
+        image_data['sharpened_text_without_misspelled'] = ''
+        image_data['added_words'] = ''
+        image_data['removed_words'] = ''
+
+    return image_data, stats
+
 # Function to process images and extract text with verification
-def extract_text_from_images(directory):
-    # Initialize the OCR readers
-    reader_simplified = easyocr.Reader(['en', 'ch_sim'], verbose=False)
-    reader_traditional = easyocr.Reader(['en', 'ch_tra'], verbose=False)
+# (the statistics accumulate in metrics, a RunMetrics, as each image finishes)
+def extract_text_from_images(directory, cache=None, on_result=None, manifest=None, gated=False, profile=None,
+                             regions_only=False, domain_files=(), metrics=None):
+    # Initialize the OCR readers (the Traditional Chinese reader shares the Simplified reader's detector)
+    reader_simplified, reader_traditional = build_readers()
 
-    # Initialize spell checker
-    spell = SpellChecker(language='en')
-    custom_words = ['cas', 'CAS', 'CAS*']
-    spell.word_frequency.load_words(custom_words)
+    # Load the precompiled English + domain vocabulary index (includes 'cas')
+    spell = get_spell_index('en', domain_files)
 
     # Initialize list to store data for the excel file
+    # (when on_result is given, each image's data is handed to it instead, e.g. to stream it to Excel)
     data = []
-    total_images = 0
-    images_with_text = 0
-    images_without_text = 0
-    failed_extractions = 0
-    low_confidence_count = 0
-    spell_errors_count = 0
-    total_extracted_elements = 0  # Counter for total extracted elements
-
-    # For sharpened images
-    sharpened_low_confidence_count = 0
-    sharpened_spell_errors_count = 0
-    total_sharpened_extracted_elements = 0
-
-    # To calculate average confidences
-    total_confidence = 0
-    total_sharpened_confidence = 0
-
-    # Collect texts for text files
-    english_texts = []
-    mandarin_texts = []
-    original_texts = []
+
+    # Run metrics (counters and histograms, updated as each image finishes) and the texts collected
+    # for the text files
+    if metrics is None:
+        metrics = RunMetrics(histogram_buckets={'confidence': CONFIDENCE_BUCKETS})
+    texts = {name: [] for name in STAT_TEXTS}
 
     # Supported image extensions
     supported_extensions = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
@@ -70,249 +345,118 @@ def extract_text_from_images(directory):
     # Loop through the directory with tqdm progress bar
     for filename in tqdm(os.listdir(directory), desc="Processing Images", unit="image"):
         if filename.lower().endswith(supported_extensions):
-            total_images += 1  # Count total images
             file_path = os.path.join(directory, filename)
 
-            # Initialize data dictionary for this image
-            image_data = {
-                'file_path': file_path,
-                'filename': filename,
-            }
-
-            # Open and read the image using EasyOCR
-            try:
-                # Process original image
-                # Try using the Simplified Chinese reader first
-                results = reader_simplified.readtext(file_path, detail=1)
-
-                if not results:  # If no text found, try Traditional Chinese reader
-                    results = reader_traditional.readtext(file_path, detail=1)
-
-                if results:
-                    images_with_text += 1  # Text was found
-                    total_extracted_elements += len(results)  # Count extracted elements
-                    extracted_text = ' '.join([res[1] for res in results])
-
-                    # Calculate average confidence
-                    confidences = [res[2] for res in results]
-                    avg_confidence = sum(confidences) / len(confidences)
-                    total_confidence += avg_confidence
-
-                    # Count low confidence text elements
-                    low_confidence_elements = [c for c in confidences if c < 0.5]
-                    low_confidence_count += len(low_confidence_elements)
-
-                    # Determine verification status based on average confidence
-                    verification_status = "Low Confidence" if avg_confidence < 0.6 else "Verified"
-
-                    # Spell Checking for English Text
-                    misspelled_words = []
-                    detected_language = 'en'  # Default language since we are focusing on English
-                    if detected_language == 'en':
-                        words = preprocess_words(extracted_text)
-                        misspelled = spell.unknown(words)
-                        if misspelled:
-                            misspelled_words = list(misspelled)
-                            spell_errors_count += len(misspelled)
-                            verification_status += f" | {len(misspelled)} Spell Errors"
-
-                    # Collect English and Mandarin texts
-                    english_text = extract_english_text(extracted_text)
-                    if english_text:
-                        original_texts.append(extracted_text)
-                    mandarin_text = extract_mandarin_text(extracted_text)
-                    if mandarin_text:
-                        mandarin_texts.append(mandarin_text)
-
-                else:
-                    images_without_text += 1  # No text found
-                    extracted_text = "No text found"
-                    avg_confidence = 0
-                    verification_status = "No Text"
-                    misspelled_words = []
-
-                # Add data to image_data dictionary
-                image_data['extracted_text'] = extracted_text
-                image_data['avg_confidence'] = avg_confidence
-                image_data['verification_status'] = verification_status
-                image_data['misspelled_words'] = ', '.join(misspelled_words)
-
-                # Now process the sharpened image
-                # Open image
-                img = Image.open(file_path)
-                # Sharpen image
-                sharpened_img = img.filter(ImageFilter.SHARPEN)
-                # Save to a temporary file
-                temp_sharpened_file = os.path.join(directory, 'temp_sharpened_' + filename)
-                sharpened_img.save(temp_sharpened_file)
-
-                # Process the sharpened image
-                results_sharp = reader_simplified.readtext(temp_sharpened_file, detail=1)
-                if not results_sharp:  # If no text found, try Traditional Chinese reader
-                    results_sharp = reader_traditional.readtext(temp_sharpened_file, detail=1)
-
-                if results_sharp:
-                    total_sharpened_extracted_elements += len(results_sharp)
-                    sharpened_extracted_text = ' '.join([res[1] for res in results_sharp])
-
-                    # Calculate average confidence
-                    sharpened_confidences = [res[2] for res in results_sharp]
-                    sharpened_avg_confidence = sum(sharpened_confidences) / len(sharpened_confidences)
-                    total_sharpened_confidence += sharpened_avg_confidence
-
-                    # Count low confidence text elements
-                    sharpened_low_confidence_elements = [c for c in sharpened_confidences if c < 0.5]
-                    sharpened_low_confidence_count += len(sharpened_low_confidence_elements)
-
-                    # Determine verification status based on average confidence
-                    sharpened_verification_status = "Low Confidence" if sharpened_avg_confidence < 0.6 else "Verified"
-
-                    # Spell Checking for English Text
-                    sharpened_misspelled_words = []
-                    detected_language = 'en'  # Default language since we are focusing on English
-                    if detected_language == 'en':
-                        words_sharp = preprocess_words(sharpened_extracted_text)
-                        misspelled_sharp = spell.unknown(words_sharp)
-                        if misspelled_sharp:
-                            sharpened_misspelled_words = list(misspelled_sharp)
-                            sharpened_spell_errors_count += len(misspelled_sharp)
-                            sharpened_verification_status += f" | {len(misspelled_sharp)} Spell Errors"
-
-                    # Collect English and Mandarin texts from sharpened images
-                    english_text_sharp = extract_english_text(sharpened_extracted_text)
-                    if english_text_sharp:
-                        english_texts.append(english_text_sharp)
-                    mandarin_text_sharp = extract_mandarin_text(sharpened_extracted_text)
-                    if mandarin_text_sharp:
-                        mandarin_texts.append(mandarin_text_sharp)
-
-                else:
-                    sharpened_extracted_text = "No text found"
-                    sharpened_avg_confidence = 0
-                    sharpened_verification_status = "No Text"
-                    sharpened_misspelled_words = []
-                    words_sharp = []
-
-                # Remove the temporary sharpened image file
-                os.remove(temp_sharpened_file)
-
-                # Add data to image_data dictionary
-                image_data['sharpened_extracted_text'] = sharpened_extracted_text
-                image_data['sharpened_avg_confidence'] = sharpened_avg_confidence
-                image_data['sharpened_verification_status'] = sharpened_verification_status
-                image_data['sharpened_misspelled_words'] = ', '.join(sharpened_misspelled_words)
-
-                # Get the sharpened extracted text without misspelled words
-                words_sharp_corrected = [word for word in words_sharp if word not in sharpened_misspelled_words]
-                sharpened_text_without_misspelled = ' '.join(words_sharp_corrected)
-                image_data['sharpened_text_without_misspelled'] = sharpened_text_without_misspelled
-
-                # Compare extracted_text and sharpened_extracted_text to find added and removed words
-                words_original = set(preprocess_words(extracted_text))
-                words_sharpened = set(preprocess_words(sharpened_extracted_text))
-                added_words = words_sharpened - words_original
-                removed_words = words_original - words_sharpened
-
-                image_data['added_words'] = ', '.join(added_words)
-                image_data['removed_words'] = ', '.join(removed_words)
-
-                # Append image_data to data list
+            # Re-use the checkpoint from an interrupted earlier run if this image was already finished
+            # (failed images are retried, including failures checkpointed by older versions of this script)
+            checkpoint = manifest.lookup(file_path) if manifest is not None else None
+            if checkpoint is not None and not checkpoint['stats'].get('failed_extractions'):
+                image_data, stats = checkpoint['image_data'], checkpoint['stats']
+                image_data['file_path'] = file_path
+                metrics.inc('images_resumed')
+            else:
+                image_data, stats = process_image(reader_simplified, reader_traditional, spell, file_path, cache,
+                                                  gated, profile, regions_only)
+                if manifest is not None and not stats['failed_extractions']:
+                    manifest.record(file_path, {'image_data': image_data, 'stats': stats})
+
+                # Only work done in this run counts towards bytes read and stage latency
+                metrics.inc('bytes_read', os.path.getsize(file_path))
+                for stage, seconds in stats['stage_seconds'].items():
+                    metrics.observe('stage_seconds', seconds, stage=stage)
+
+            for name in STAT_COUNTERS:
+                metrics.inc(name, stats[name])
+            # (checkpoints from before the confidence histograms have no confidences)
+            for confidence in stats.get('confidences', []):
+                metrics.observe('confidence', confidence, variant='original')
+            for confidence in stats.get('sharpened_confidences', []):
+                metrics.observe('confidence', confidence, variant='sharpened')
+            for name in STAT_TEXTS:
+                texts[name].extend(stats[name])
+
+            # Append image_data to data list (or hand it straight to on_result)
+            if on_result is not None:
+                on_result(image_data)
+            else:
                 data.append(image_data)
 
-            except Exception as e:
-                failed_extractions += 1  # OCR failed
-                print(f"Error processing {filename}: {e}")
-                image_data['extracted_text'] = "Error in OCR"
-                image_data['avg_confidence'] = 0
-                image_data['verification_status'] = "Failed"
-                image_data['misspelled_words'] = ''
-                image_data['sharpened_extracted_text'] = "Error in OCR"
-                image_data['sharpened_avg_confidence'] = 0
-                image_data['sharpened_verification_status'] = "Failed"
-                image_data['sharpened_misspelled_words'] = ''
-                image_data['sharpened_text_without_misspelled'] = ''
-                image_data['added_words'] = ''
-                image_data['removed_words'] = ''
-                data.append(image_data)
-
-    # Now we need to calculate average confidence levels
-    average_confidence = total_confidence / images_with_text if images_with_text > 0 else 0
-    average_sharpened_confidence = total_sharpened_confidence / total_images if total_images > 0 else 0
-
-    # Return collected data and stats
-    return (data, total_images, images_with_text, images_without_text, failed_extractions, low_confidence_count, spell_errors_count, total_extracted_elements, sharpened_low_confidence_count, sharpened_spell_errors_count, total_sharpened_extracted_elements, average_confidence, average_sharpened_confidence, english_texts, mandarin_texts, original_texts)
+            # Write a live snapshot every METRICS_EXPORT_INTERVAL seconds
+            metrics.maybe_export()
+
+    # Return collected data, the run's metrics and the collected texts
+    return data, metrics, texts
+
+# Excel layout: headers and column widths for the OCR Results sheet
+EXCEL_HEADERS = ["Image", "Image Name", "Extracted Text", "Avg Confidence", "Verification Status", "Misspelled Words",
+                 "Sharpened Extracted Text", "Sharpened Avg Confidence", "Sharpened Verification Status",
+                 "Sharpened Misspelled Words",
+                 "Sharpened Text Without Misspelled Words", "Added Words", "Removed Words", "Mandarin Text (Sharpened)"]
+EXCEL_COLUMN_WIDTHS = {
+    'A': 30,  # Adjust the width of the column for images
+    'B': 20,  # Image name column width
+    'C': 50,  # Extracted text column width
+    'D': 15,  # Average Confidence column
+    'E': 30,  # Verification Status column
+    'F': 50,  # Misspelled Words column width
+    'G': 50,  # Sharpened Extracted Text
+    'H': 15,  # Sharpened Avg Confidence
+    'I': 30,  # Sharpened Verification Status
+    'J': 50,  # Sharpened Misspelled Words
+    'K': 50,  # Sharpened Text Without Misspelled Words
+    'L': 50,  # Added Words
+    'M': 50,  # Removed Words
+    'N': 50,  # Mandarin Text from Sharpened Images
+}
+
+# Function to open the Excel writer for the results (streaming=True writes rows as they arrive)
+def open_excel_writer(directory, excel_filename, streaming=False):
+    excel_path = os.path.join(directory, excel_filename)
+    return ExcelResultsWriter(excel_path, EXCEL_HEADERS, EXCEL_COLUMN_WIDTHS, streaming=streaming,
+                              image_mode=EXCEL_IMAGE_MODE)
+
+# Function to write one image's results as a row of the Excel sheet
+def write_excel_row(writer, image_data):
+    image_path = image_data['file_path']
+    image_name = image_data['filename']
+
+    # Insert image into the Excel sheet
+    try:
+        # Adjust the width and height of the image
+        writer.add_image('A', image_path, 200, 150)  # Add image in column A
+    except Exception as e:
+        print(f"Error adding image {image_name} to Excel: {e}")
+
+    # Add Mandarin text from sharpened image to column N
+    mandarin_text_sharpened = extract_mandarin_text(image_data.get('sharpened_extracted_text', ''))
+
+    # Write data into the sheet, with the row height matching the image height
+    writer.append([
+        None,
+        image_name,
+        image_data.get('extracted_text', ''),
+        round(image_data.get('avg_confidence', 0), 2),
+        image_data.get('verification_status', ''),
+        image_data.get('misspelled_words', ''),
+        image_data.get('sharpened_extracted_text', ''),
+        round(image_data.get('sharpened_avg_confidence', 0), 2),
+        image_data.get('sharpened_verification_status', ''),
+        image_data.get('sharpened_misspelled_words', ''),
+        image_data.get('sharpened_text_without_misspelled', ''),
+        image_data.get('added_words', ''),
+        image_data.get('removed_words', ''),
+        mandarin_text_sharpened,
+    ], row_height=150 * 0.75)  # Approximate conversion from pixels to Excel row height
 
-# Function to save images and text to Excel
 # Function to save images and text to Excel
 def save_to_excel(directory, data, excel_filename):
-    # Create a workbook and select the active worksheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "OCR Results"
-
-    # Set column widths
-    ws.column_dimensions['A'].width = 30  # Adjust the width of the column for images
-    ws.column_dimensions['B'].width = 20  # Image name column width
-    ws.column_dimensions['C'].width = 50  # Extracted text column width
-    ws.column_dimensions['D'].width = 15  # Average Confidence column
-    ws.column_dimensions['E'].width = 30  # Verification Status column
-    ws.column_dimensions['F'].width = 50  # Misspelled Words column width
-    ws.column_dimensions['G'].width = 50  # Sharpened Extracted Text
-    ws.column_dimensions['H'].width = 15  # Sharpened Avg Confidence
-    ws.column_dimensions['I'].width = 30  # Sharpened Verification Status
-    ws.column_dimensions['J'].width = 50  # Sharpened Misspelled Words
-    ws.column_dimensions['K'].width = 50  # Sharpened Text Without Misspelled Words
-    ws.column_dimensions['L'].width = 50  # Added Words
-    ws.column_dimensions['M'].width = 50  # Removed Words
-    ws.column_dimensions['N'].width = 50  # Mandarin Text from Sharpened Images
-
-    # Write headers
-    ws.append(["Image", "Image Name", "Extracted Text", "Avg Confidence", "Verification Status", "Misspelled Words",
-               "Sharpened Extracted Text", "Sharpened Avg Confidence", "Sharpened Verification Status",
-               "Sharpened Misspelled Words",
-               "Sharpened Text Without Misspelled Words", "Added Words", "Removed Words", "Mandarin Text (Sharpened)"])
-
-    for i, image_data in enumerate(data, start=2):
-        image_path = image_data['file_path']
-        image_name = image_data['filename']
-
-        # Insert image into the Excel sheet
-        try:
-            img = ExcelImage(image_path)
-
-            # Optionally, adjust image dimensions (optional)
-            img.width = 200  # Adjust the width of the image
-            img.height = 150  # Adjust the height of the image
-            ws.add_image(img, f'A{i}')  # Add image in column A
-        except Exception as e:
-            print(f"Error adding image {image_name} to Excel: {e}")
-
-        # Write data into the sheet
-        ws[f'B{i}'] = image_name
-        ws[f'C{i}'] = image_data.get('extracted_text', '')
-        ws[f'D{i}'] = round(image_data.get('avg_confidence', 0), 2)
-        ws[f'E{i}'] = image_data.get('verification_status', '')
-        ws[f'F{i}'] = image_data.get('misspelled_words', '')
-        ws[f'G{i}'] = image_data.get('sharpened_extracted_text', '')
-        ws[f'H{i}'] = round(image_data.get('sharpened_avg_confidence', 0), 2)
-        ws[f'I{i}'] = image_data.get('sharpened_verification_status', '')
-        ws[f'J{i}'] = image_data.get('sharpened_misspelled_words', '')
-        ws[f'K{i}'] = image_data.get('sharpened_text_without_misspelled', '')
-        ws[f'L{i}'] = image_data.get('added_words', '')
-        ws[f'M{i}'] = image_data.get('removed_words', '')
-
-        # Add Mandarin text from sharpened image to column N
-        mandarin_text_sharpened = extract_mandarin_text(image_data.get('sharpened_extracted_text', ''))
-        ws[f'N{i}'] = mandarin_text_sharpened
-
-        # Set row height to match the image height
-        row_height = 150 * 0.75  # Approximate conversion from pixels to Excel row height
-        ws.row_dimensions[i].height = row_height
+    # Create a workbook and write one row per image
+    with open_excel_writer(directory, excel_filename) as writer:
+        for image_data in data:
+            write_excel_row(writer, image_data)
 
     # Save the Excel file in the images directory
-    excel_path = os.path.join(directory, excel_filename)
-    wb.save(excel_path)
-    print(f"Data has been successfully exported to {excel_path}")
+    print(f"Data has been successfully exported to {writer.path}")
 
 
 # Function to save text files
@@ -339,24 +483,59 @@ def save_text_files(directory, english_texts, mandarin_texts, original_texts):
             f.write(text + '\n')
     print(f"Original extracted texts saved to {original_text_file}")
 
-# Function to generate stats report
-def generate_stats_report(directory, total_images, images_with_text, images_without_text, failed_extractions, time_taken, low_confidence_count, spell_errors_count, total_extracted_elements, sharpened_low_confidence_count, sharpened_spell_errors_count, total_sharpened_extracted_elements, average_confidence, average_sharpened_confidence):
+# Function to format part as a percentage of whole (n/a when nothing was counted)
+def percentage(part, whole):
+    return f"{part / whole * 100:.2f}%" if whole else "n/a"
+
+# Function to generate stats report from the run's metrics
+def generate_stats_report(directory, metrics, time_taken):
     report_file_path = os.path.join(directory, "stats_report.txt")
 
+    total_images = metrics.value('total_images')
+    images_with_text = metrics.value('images_with_text')
+    images_without_text = metrics.value('images_without_text')
+    failed_extractions = metrics.value('failed_extractions')
+    second_passes_skipped = metrics.value('second_passes_skipped')
+    total_extracted_elements = metrics.value('total_extracted_elements')
+    total_sharpened_extracted_elements = metrics.value('total_sharpened_extracted_elements')
+    low_confidence_count = metrics.value('low_confidence_count')
+    sharpened_low_confidence_count = metrics.value('sharpened_low_confidence_count')
+    spell_errors_count = metrics.value('spell_errors_count')
+    sharpened_spell_errors_count = metrics.value('sharpened_spell_errors_count')
+
+    # Average of the per-image average confidences
+    # (images whose second pass was skipped have no sharpened confidence)
+    average_confidence = metrics.value('total_confidence') / images_with_text if images_with_text > 0 else 0
+    second_pass_images = total_images - second_passes_skipped
+    average_sharpened_confidence = (metrics.value('total_sharpened_confidence') / second_pass_images
+                                    if second_pass_images > 0 else 0)
+
     with open(report_file_path, "w") as report_file:
         report_file.write("EasyOCR Stats Report\n")
         report_file.write("====================\n\n")
         report_file.write(f"Time Taken: {time_taken:.2f} seconds\n")
         report_file.write(f"Total Images: {total_images}\n")
-        report_file.write(f"Images with Text Extracted: {images_with_text} ({images_with_text / total_images * 100:.2f}%)\n")
-        report_file.write(f"Images without Text: {images_without_text} ({images_without_text / total_images * 100:.2f}%)\n")
-        report_file.write(f"Failed Extractions: {failed_extractions} ({failed_extractions / total_images * 100:.2f}%)\n")
+        report_file.write(f"Images with Text Extracted: {images_with_text} ({percentage(images_with_text, total_images)})\n")
+        report_file.write(f"Images without Text: {images_without_text} ({percentage(images_without_text, total_images)})\n")
+        report_file.write(f"Failed Extractions: {failed_extractions} ({percentage(failed_extractions, total_images)})\n")
+        report_file.write(f"Second Passes Skipped (Original Confident): {second_passes_skipped} ({percentage(second_passes_skipped, total_images)})\n")
         report_file.write(f"Average Confidence Level (Original Images): {average_confidence:.2f}\n")
         report_file.write(f"Average Confidence Level (Sharpened Images): {average_sharpened_confidence:.2f}\n")
-        report_file.write(f"Low Confidence Text Elements (Original): {low_confidence_count} ({low_confidence_count} / {total_extracted_elements} = {low_confidence_count / total_extracted_elements * 100:.2f}%)\n")
-        report_file.write(f"Low Confidence Text Elements (Sharpened): {sharpened_low_confidence_count} ({sharpened_low_confidence_count} / {total_sharpened_extracted_elements} = {sharpened_low_confidence_count / total_sharpened_extracted_elements * 100:.2f}%)\n")
-        report_file.write(f"Spell Errors (English) (Original): {spell_errors_count} ({spell_errors_count} / {total_extracted_elements} = {spell_errors_count / total_extracted_elements * 100:.2f}%)\n")
-        report_file.write(f"Spell Errors (English) (Sharpened): {sharpened_spell_errors_count} ({sharpened_spell_errors_count} / {total_sharpened_extracted_elements} = {sharpened_spell_errors_count / total_sharpened_extracted_elements * 100:.2f}%)\n")
+        report_file.write(f"Low Confidence Text Elements (Original): {low_confidence_count} ({low_confidence_count} / {total_extracted_elements} = {percentage(low_confidence_count, total_extracted_elements)})\n")
+        report_file.write(f"Low Confidence Text Elements (Sharpened): {sharpened_low_confidence_count} ({sharpened_low_confidence_count} / {total_sharpened_extracted_elements} = {percentage(sharpened_low_confidence_count, total_sharpened_extracted_elements)})\n")
+        report_file.write(f"Spell Errors (English) (Original): {spell_errors_count} ({spell_errors_count} / {total_extracted_elements} = {percentage(spell_errors_count, total_extracted_elements)})\n")
+        report_file.write(f"Spell Errors (English) (Sharpened): {sharpened_spell_errors_count} ({sharpened_spell_errors_count} / {total_sharpened_extracted_elements} = {percentage(sharpened_spell_errors_count, total_sharpened_extracted_elements)})\n")
+
+        # Where the time went, for the images processed in this run
+        report_file.write("\nStage Latency (mean seconds per image):\n")
+        stages = [(stage, metrics.histogram('stage_seconds', stage=stage))
+                  for stage in ('hash', 'original_pass', 'sharpened_pass', 'spell_check')]
+        for stage, histogram in stages:
+            if histogram is not None:
+                report_file.write(f"  {stage}: {histogram.sum / histogram.count:.3f} ({histogram.count} images)\n")
+        if all(histogram is None for _, histogram in stages):
+            report_file.write("  (no images were processed in this run)\n")
+        report_file.write(f"Bytes Read: {metrics.value('bytes_read')}\n")
 
     print(f"Stats report saved to {report_file_path}")
 
@@ -380,36 +559,52 @@ def main():
         excel_filename += ".xlsx"
 
     # Extract text from images
-    result = extract_text_from_images(directory)
-    data = result[0]
-    total_images = result[1]
-    images_with_text = result[2]
-    images_without_text = result[3]
-    failed_extractions = result[4]
-    low_confidence_count = result[5]
-    spell_errors_count = result[6]
-    total_extracted_elements = result[7]
-    sharpened_low_confidence_count = result[8]
-    sharpened_spell_errors_count = result[9]
-    total_sharpened_extracted_elements = result[10]
-    average_confidence = result[11]
-    average_sharpened_confidence = result[12]
-    english_texts = result[13]
-    mandarin_texts = result[14]
-    original_texts = result[15]
+    # Re-use OCR results from earlier runs over the same images
+    cache = OCRCache()
+    # Checkpoint every finished image so an interrupted run picks up where it stopped
+    manifest = RunManifest(os.path.join(directory, MANIFEST_FILENAME), OCR_SETTINGS)
+    if manifest.entries:
+        print(f"Found checkpoints for {len(manifest.entries)} images from an earlier run")
+    # Counters and histograms for the run, with live snapshots in the image directory
+    metrics = RunMetrics(os.path.join(directory, METRICS_FILENAME), METRICS_EXPORT_INTERVAL,
+                         histogram_buckets={'confidence': CONFIDENCE_BUCKETS})
+    try:
+        if STREAMING_EXPORT:
+            # Write each image's row as soon as it is processed instead of holding everything until the end
+            # (the workbook is saved on the way out, so an interrupted run keeps the rows written so far)
+            with open_excel_writer(directory, excel_filename, streaming=True) as writer:
+                data, metrics, texts = extract_text_from_images(
+                    directory, cache, on_result=lambda image_data: write_excel_row(writer, image_data),
+                    manifest=manifest, gated=GATED_SECOND_PASS, profile=RESOLUTION_PROFILE,
+                    regions_only=SHARPEN_REGIONS_ONLY, domain_files=SPELL_DOMAIN_FILES, metrics=metrics)
+        else:
+            data, metrics, texts = extract_text_from_images(
+                directory, cache, manifest=manifest, gated=GATED_SECOND_PASS, profile=RESOLUTION_PROFILE,
+                regions_only=SHARPEN_REGIONS_ONLY, domain_files=SPELL_DOMAIN_FILES, metrics=metrics)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Finished images are saved in {manifest.path}; run again to resume.")
+        return
+    finally:
+        manifest.close()
+        # Final metrics snapshot (also written when the run is interrupted)
+        metrics.export()
 
     # Save data to Excel
-    save_to_excel(directory, data, excel_filename)
+    if STREAMING_EXPORT:
+        print(f"Data has been successfully exported to {', '.join(writer.saved_paths)}")
+    else:
+        save_to_excel(directory, data, excel_filename)
 
     # Save text files
-    save_text_files(directory, english_texts, mandarin_texts, original_texts)
+    save_text_files(directory, texts['english_texts'], texts['mandarin_texts'], texts['original_texts'])
 
     # End the timer
     end_time = time.time()
     time_taken = end_time - start_time
 
     # Generate stats report
-    generate_stats_report(directory, total_images, images_with_text, images_without_text, failed_extractions, time_taken, low_confidence_count, spell_errors_count, total_extracted_elements, sharpened_low_confidence_count, sharpened_spell_errors_count, total_sharpened_extracted_elements, average_confidence, average_sharpened_confidence)
+    generate_stats_report(directory, metrics, time_taken)
+    print(f"Run metrics saved to {metrics.export_base}.json")
 
 if __name__ == "__main__":
     main()
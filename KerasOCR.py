@@ -5,17 +5,141 @@ import warnings
 warnings.filterwarnings('ignore')
 
 import keras_ocr
+import math
+import numpy as np
 import pandas as pd
 import os
 import time
-from spellchecker import SpellChecker
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as OpenPyXLImage
-
+from spell_index import get_spell_index
+from excel_export import ExcelResultsWriter
+from ocr_cache import OCRCache, hash_file, make_key
+from resolution import map_box_to_original, normalize_resolution, resolution_variant
+
+# Number of images per keras-ocr pipeline call; 1 recognizes each image on its own
+BATCH_SIZE = 1
+
+# Domain vocabulary merged into the English spell checking index (see spell_index.py), e.g.
+# ['Fentanyl_Precursors_All.xls'] for its substance names, synonyms and CAS numbers
+SPELL_DOMAIN_FILES = []
+
+# Resolution profile applied before OCR (see resolution.py): 'keras_ocr' scales huge photos down and tiny
+# crops up, with word boxes mapped back to the original image; None OCRs images at their own size
+RESOLUTION_PROFILE = None
+
+# Stream rows to write-only workbooks as images are processed (recommended for very large folders)
+STREAMING_EXPORT = False
+
+# How images go into the Excel sheet: 'thumbnail' (small in-memory JPEGs at the displayed size),
+# 'embed' (the full-resolution files) or 'link' (hyperlinks to the original files)
+EXCEL_IMAGE_MODE = 'thumbnail'
+
+
+# Function to look up cached (word, box) predictions for an image, returning (key, prediction or None)
+def lookup_cached(image_path, cache, profile=None):
+    key = make_key(hash_file(image_path), 'keras-ocr', ('en',), resolution_variant('original', profile))
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+    return key, [[(text, np.array(box)) for text, box in cached]]
+
+
+# Function to read an image, normalizing its resolution for a profile; returns (image, scale)
+def read_image(image_path, profile=None):
+    image = keras_ocr.tools.read(image_path)
+    if profile is None:
+        return image, 1.0
+    return normalize_resolution(image, profile)
+
+
+# Function to map (word, box) predictions from a normalized image back to original image coordinates
+def map_prediction_to_original(prediction, scale):
+    return [(text, map_box_to_original(box, scale)) for text, box in prediction]
+
+
+# Function to run keras-ocr on one image (path, normalized for profile if given)
+def recognize_image(keras_ocr_pipeline, image_path, profile=None):
+    if profile is None:
+        return keras_ocr_pipeline.recognize([image_path])
+    image, scale = read_image(image_path, profile)
+    return [map_prediction_to_original(keras_ocr_pipeline.recognize([image])[0], scale)]
+
+
+# Function to run keras-ocr on one image, re-using cached (word, box) predictions when a cache is given
+def recognize_cached(keras_ocr_pipeline, image_path, cache=None, profile=None):
+    if cache is None:
+        return recognize_image(keras_ocr_pipeline, image_path, profile)
+    key, prediction = lookup_cached(image_path, cache, profile)
+    if prediction is not None:
+        return prediction
+    prediction = recognize_image(keras_ocr_pipeline, image_path, profile)
+    cache.put(key, prediction[0])
+    return prediction
+
+
+# Function to group images into batches whose resized dimensions are similar
+def bucket_images(images, keras_ocr_pipeline, batch_size, bucket_step=64):
+    buckets = {}
+    for image_path, image in images.items():
+        # Mirror the pipeline's own resize so images in a batch need little or no padding
+        if max(image.shape) * keras_ocr_pipeline.scale > keras_ocr_pipeline.max_size:
+            scale = keras_ocr_pipeline.max_size / max(image.shape)
+        else:
+            scale = keras_ocr_pipeline.scale
+        height, width = int(image.shape[0] * scale), int(image.shape[1] * scale)
+        key = (math.ceil(height / bucket_step), math.ceil(width / bucket_step))
+        buckets.setdefault(key, []).append(image_path)
+
+    batches = []
+    for image_paths in buckets.values():
+        for start in range(0, len(image_paths), batch_size):
+            batches.append(image_paths[start:start + batch_size])
+    return batches
+
+
+# Function to run keras-ocr over many images in size-bucketed batches
+# Returns {image_path: prediction} where a prediction is an Exception if that image failed
+def recognize_batched(keras_ocr_pipeline, image_paths, batch_size, cache=None, profile=None):
+    predictions = {}
+    keys = {}
+    images = {}
+    scales = {}
+    for image_path in image_paths:
+        try:
+            if cache is not None:
+                keys[image_path], prediction = lookup_cached(image_path, cache, profile)
+                if prediction is not None:
+                    predictions[image_path] = prediction
+                    continue
+            images[image_path], scales[image_path] = read_image(image_path, profile)
+        except Exception as e:
+            predictions[image_path] = e
 
-def extract_text_from_images(directory):
+    for batch in bucket_images(images, keras_ocr_pipeline, batch_size):
+        try:
+            batch_predictions = keras_ocr_pipeline.recognize([images[image_path] for image_path in batch])
+        except Exception:
+            # Retry one image at a time so only the images that actually fail are counted
+            batch_predictions = []
+            for image_path in batch:
+                try:
+                    batch_predictions.append(keras_ocr_pipeline.recognize([images[image_path]])[0])
+                except Exception as e:
+                    batch_predictions.append(e)
+
+        for image_path, prediction in zip(batch, batch_predictions):
+            if isinstance(prediction, Exception):
+                predictions[image_path] = prediction
+                continue
+            prediction = map_prediction_to_original(prediction, scales[image_path])
+            predictions[image_path] = [prediction]
+            if cache is not None:
+                cache.put(keys[image_path], prediction)
+    return predictions
+
+
+def extract_text_from_images(directory, cache=None, batch_size=1, on_result=None, profile=None, domain_files=()):
     keras_ocr_pipeline = keras_ocr.pipeline.Pipeline()
-    spell_checker = SpellChecker()  # Initialize the spell checker
+    spell_checker = get_spell_index('en', domain_files)  # Load the precompiled spell checking index
     images = []
     for filename in os.listdir(directory):
         if filename.endswith(('.png', '.jpg', '.jpeg')):
@@ -28,11 +152,22 @@ def extract_text_from_images(directory):
     total_words = 0  # Track total words
     total_misspelled = 0  # Track total misspelled words
 
-    for image_path in images:
+    # Batched mode recognizes a window of images up front, a few batches at a time to bound memory
+    window_size = batch_size * 4 if batch_size > 1 else len(images)
+    batched_predictions = {}
+
+    for index, image_path in enumerate(images):
+        if batch_size > 1 and index % window_size == 0:
+            batched_predictions = recognize_batched(keras_ocr_pipeline, images[index:index + window_size],
+                                                    batch_size, cache, profile)
         try:
-            prediction = keras_ocr_pipeline.recognize([image_path])
+            if batch_size > 1:
+                prediction = batched_predictions[image_path]
+                if isinstance(prediction, Exception):
+                    raise prediction
+            else:
+                prediction = recognize_cached(keras_ocr_pipeline, image_path, cache, profile)
             full_text = " ".join([text for text, _ in prediction[0]])
-            data.append((image_path, full_text))
             total_extracted_elements += len(prediction[0])
 
             # Count words and misspelled words
@@ -41,49 +176,51 @@ def extract_text_from_images(directory):
             misspelled_words = [word for word in words if word and word not in spell_checker]
             total_misspelled += len(misspelled_words)
 
-            data[-1] += (misspelled_words,)  # Add misspelled words to the data
-
             if len(full_text) < 3:  # Example condition for low confidence
                 low_confidence_count += 1
 
         except Exception as e:
             print(f"Error processing {image_path}: {e}")
             failed_extractions += 1
+            continue
+
+        # Add the row to the data (or hand it straight to on_result, e.g. to stream it to Excel); this is
+        # outside the try so an export error isn't counted as a failed extraction
+        row = (image_path, full_text, misspelled_words)
+        if on_result is not None:
+            on_result(row)
+        else:
+            data.append(row)
 
     return data, len(images), failed_extractions, low_confidence_count, total_extracted_elements, total_words, total_misspelled
 
 
-def save_to_excel(data, output_file):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "OCR Results"
+# Excel layout: headers and column widths for the OCR Results sheet
+EXCEL_HEADERS = ['Image', 'Extracted Text', 'Misspelled Words Count', 'Misspelled Words']
+EXCEL_IMAGE_SIZE = 100  # Width and height of the embedded images
+EXCEL_COLUMN_WIDTHS = {'A': EXCEL_IMAGE_SIZE * 0.12}  # Adjust for padding
 
-    ws.append(['Image', 'Extracted Text', 'Misspelled Words Count', 'Misspelled Words'])  # Add headers
 
-    for image_path, extracted_text, misspelled_words in data:
-        img = OpenPyXLImage(image_path)
-        img.width = 100  # Set the width of the image
-        img.height = 100  # Set the height of the image
+def open_excel_writer(output_file, streaming=False):
+    return ExcelResultsWriter(output_file, EXCEL_HEADERS, EXCEL_COLUMN_WIDTHS, streaming=streaming,
+                              image_mode=EXCEL_IMAGE_MODE)
 
-        img_row = ws.max_row + 1
-        img_col = 1
 
-        ws.add_image(img, ws.cell(row=img_row, column=img_col).coordinate)
+def write_excel_row(writer, row):
+    image_path, extracted_text, misspelled_words = row
 
-        ws.row_dimensions[img_row].height = img.height * 0.75  # Adjust for padding
-        ws.column_dimensions[
-            ws.cell(row=img_row, column=img_col).column_letter].width = img.width * 0.12  # Adjust for padding
+    writer.add_image('A', image_path, EXCEL_IMAGE_SIZE, EXCEL_IMAGE_SIZE)
 
-        ws.cell(row=img_row, column=2, value=extracted_text)
+    # Count the misspelled words and write them as a comma-separated string
+    misspelled_count = len(misspelled_words)
+    writer.append([None, extracted_text, misspelled_count, ', '.join(misspelled_words)],
+                  row_height=EXCEL_IMAGE_SIZE * 0.75)  # Adjust for padding
 
-        # Count and write the number of misspelled words
-        misspelled_count = len(misspelled_words)
-        ws.cell(row=img_row, column=3, value=misspelled_count)
 
-        # Write the misspelled words as a comma-separated string
-        ws.cell(row=img_row, column=4, value=', '.join(misspelled_words))
-
-    wb.save(output_file)
+def save_to_excel(data, output_file):
+    with open_excel_writer(output_file) as writer:
+        for row in data:
+            write_excel_row(writer, row)
 
 
 def generate_stats_report(directory, total_images, images_with_text, images_without_text,
@@ -106,12 +243,22 @@ def main():
 
     start_time = time.time()
 
-    data, total_images, failed_extractions, low_confidence_count, total_extracted_elements, total_words, total_misspelled = extract_text_from_images(directory)
+    # Re-use OCR results from earlier runs over the same images
+    cache = OCRCache()
+    if STREAMING_EXPORT:
+        # Write each image's row as soon as it is processed instead of holding everything until the end
+        with open_excel_writer(output_file_path, streaming=True) as writer:
+            data, total_images, failed_extractions, low_confidence_count, total_extracted_elements, total_words, total_misspelled = extract_text_from_images(
+                directory, cache, BATCH_SIZE, on_result=lambda row: write_excel_row(writer, row), profile=RESOLUTION_PROFILE,
+                domain_files=SPELL_DOMAIN_FILES)
+    else:
+        data, total_images, failed_extractions, low_confidence_count, total_extracted_elements, total_words, total_misspelled = extract_text_from_images(
+            directory, cache, BATCH_SIZE, profile=RESOLUTION_PROFILE, domain_files=SPELL_DOMAIN_FILES)
 
-    save_to_excel(data, output_file_path)
+        save_to_excel(data, output_file_path)
 
     time_taken = time.time() - start_time
-    images_with_text = len(data)
+    images_with_text = total_images - failed_extractions
     images_without_text = total_images - images_with_text
 
     generate_stats_report(directory, total_images, images_with_text, images_without_text,
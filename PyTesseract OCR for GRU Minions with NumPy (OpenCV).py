@@ -10,6 +10,10 @@ import cv2
 import pytesseract
 from PIL import Image
 import pandas as pd
+from ocr_cache import OCRCache, hash_file, make_key
+from tesseract_pool import get_default_pool
+from preprocessing_graph import build_default_graph
+from resolution import resolution_variant
 
 
 # In[2]:
@@ -17,24 +21,25 @@ import pandas as pd
 
 pytesseract.pytesseract.tesseract_cmd = r'/opt/homebrew/bin/tesseract'
 
+# Resolution profile applied right after decoding (see resolution.py): 'tesseract' scales huge photos
+# down and tiny crops up; None keeps images at their own size
+RESOLUTION_PROFILE = None
+
 
 # In[3]:
 
 
-def preprocess_image(img):
+def preprocess_image(gray):
   """
   Preprocesses an image for improved OCR results.
 
   Args:
-      img (np.ndarray): The image to be preprocessed as a NumPy array.
+      gray (np.ndarray): The 8-bit grayscale image (the graph's 'grayscale' stage).
 
   Returns:
       np.ndarray: The preprocessed image as a NumPy array.
   """
 
-  # Convert to grayscale using NumPy
-  gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
   # Apply adaptive thresholding with NumPy functions
   thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
                                 cv2.THRESH_BINARY, 11, 2)
@@ -46,10 +51,22 @@ def preprocess_image(img):
   return blur
 
 
+def build_preprocessing_graph():
+  """
+  Builds the preprocessing graph: decode and grayscale stages shared with the other scripts.
+
+  Returns:
+      PreprocessingGraph: The graph with the 'opencv_adaptive_threshold' stage.
+  """
+  graph = build_default_graph(RESOLUTION_PROFILE)
+  graph.add_stage('opencv_adaptive_threshold', preprocess_image, 'grayscale')
+  return graph
+
+
 # In[7]:
 
 
-def process_images(image_directory, output_excel_path):
+def process_images(image_directory, output_excel_path, cache=None):
     # Normalize path (expands ~ to the full user path)
     image_directory = os.path.expanduser(image_directory)
 
@@ -62,13 +79,26 @@ def process_images(image_directory, output_excel_path):
       
     data = []
 
+    # One long-lived Tesseract worker, so the language model is loaded once rather than per image
+    tesseract = get_default_pool(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
+
+    graph = build_preprocessing_graph()
+
     for image_file in image_files:
         image_path = os.path.join(image_directory, image_file)
         try:
-            img = cv2.imread(image_path)
-            img = preprocess_image(img)  
-            pil_image = Image.fromarray(img)  
-            text = pytesseract.image_to_string(pil_image)
+            def read_text():
+                img = graph.evaluate(image_path)['opencv_adaptive_threshold']
+                pil_image = Image.fromarray(img)  
+                return tesseract.image_to_string(pil_image)
+
+            # Re-use the text from an earlier run over the same image bytes
+            if cache is not None:
+                variant = resolution_variant('opencv_adaptive_threshold', RESOLUTION_PROFILE)
+                key = make_key(hash_file(image_path), 'pytesseract', ('eng',), variant)
+                text = cache.get_or_compute(key, read_text)
+            else:
+                text = read_text()
             
             # Append the filename and extracted text to the list
             data.append({'Filename': image_file, 'Extracted Text': text})
@@ -85,5 +115,8 @@ def process_images(image_directory, output_excel_path):
 image_directory = '~/Downloads/FilesImage'
 output_excel_path = '~/Downloads/extracted_texts.xlsx'
 
-process_images(image_directory, output_excel_path)
+# Persistent OCR result cache shared with the other OCR scripts
+cache = OCRCache()
+
+process_images(image_directory, output_excel_path, cache)
 
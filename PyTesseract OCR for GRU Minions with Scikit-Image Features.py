@@ -5,14 +5,19 @@
 
 
 import os
+import time
 import numpy as np
 import cv2
 import pytesseract
 from PIL import Image
 from skimage import exposure
-from skimage import filters, img_as_ubyte
+from skimage import filters, img_as_float, img_as_ubyte
 from skimage.restoration import denoise_bilateral
 import pandas as pd
+from ocr_cache import OCRCache, hash_file, make_key
+from tesseract_pool import get_default_pool
+from preprocessing_graph import build_default_graph
+from resolution import resolution_variant
 
 
 # In[2]:
@@ -20,25 +25,35 @@ import pandas as pd
 
 pytesseract.pytesseract.tesseract_cmd = r'/opt/homebrew/bin/tesseract'
 
+# Denoising used by create_scikit_image_version:
+#   'skimage'          - skimage's denoise_bilateral (the original output, by far the slowest)
+#   'opencv_bilateral' - OpenCV's bilateral filter with the same parameters, much faster
+#   'guided'           - edge-preserving guided filter built from box filters, fastest
+#   'downscaled'       - skimage's bilateral filter at quarter resolution, then upsampled
+# Run denoise_parity_check to compare their OCR word counts against 'skimage'
+DENOISE_BACKEND = 'skimage'
+DENOISE_BACKENDS = ('skimage', 'opencv_bilateral', 'guided', 'downscaled')
+
+# Resolution profile applied right after decoding (see resolution.py): 'tesseract' scales huge photos
+# down and tiny crops up; None keeps images at their own size
+RESOLUTION_PROFILE = None
+
 
 # In[3]:
 
 
-def preprocess_image(img):
+def preprocess_image(gray):
     """
     Preprocesses an image for improved OCR results.
 
     Args:
-        img (PIL.Image): The image to be preprocessed.
+        gray (np.ndarray): The 8-bit grayscale image (the graph's 'grayscale' stage).
 
     Returns:
         PIL.Image: The preprocessed image.
     """
-    # Convert to grayscale
-    img = img.convert('L')
-
     # Apply adaptive thresholding for better contrast
-    thresh = cv2.adaptiveThreshold(np.array(img), 255, 
+    thresh = cv2.adaptiveThreshold(gray, 255, 
                                    cv2.ADAPTIVE_THRESH_MEAN_C, 
                                    cv2.THRESH_BINARY, 11, 2)
 
@@ -48,24 +63,64 @@ def preprocess_image(img):
 # In[4]:
 
 
-def create_scikit_image_version(img):
+def guided_filter(image, radius=15, eps=0.05 ** 2):
+    """
+    Applies a self-guided filter, an edge-preserving smoother whose cost does not depend on radius.
+
+    Args:
+        image (np.ndarray): The float32 image in the range [0, 1].
+        radius (int): Window radius, matching the bilateral filter's spatial extent.
+        eps (float): Regularization; edges with a variance well above this are preserved.
+
+    Returns:
+        np.ndarray: The smoothed float32 image.
+    """
+    window = (2 * radius + 1, 2 * radius + 1)
+    mean = cv2.boxFilter(image, -1, window)
+    variance = cv2.boxFilter(image * image, -1, window) - mean * mean
+    a = variance / (variance + eps)
+    b = mean - a * mean
+    return cv2.boxFilter(a, -1, window) * image + cv2.boxFilter(b, -1, window)
+
+def denoise_image(gray, backend=DENOISE_BACKEND):
+    """
+    Applies edge-preserving denoising with the selected backend.
+
+    Args:
+        gray (np.ndarray): The 8-bit grayscale image.
+        backend (str): One of DENOISE_BACKENDS.
+
+    Returns:
+        np.ndarray: The denoised float image in the range [0, 1].
+    """
+    if backend == 'skimage':
+        # Takes the 8-bit image rather than a [0, 1] float one because denoise_bilateral's
+        # color range depends on the input dtype
+        return denoise_bilateral(gray, sigma_color=0.05, sigma_spatial=15)
+    if backend == 'opencv_bilateral':
+        return cv2.bilateralFilter(img_as_float(gray).astype(np.float32), -1, 0.05, 15)
+    if backend == 'guided':
+        return guided_filter(img_as_float(gray).astype(np.float32))
+    if backend == 'downscaled':
+        height, width = gray.shape
+        small = cv2.resize(gray, (max(1, width // 4), max(1, height // 4)), interpolation=cv2.INTER_AREA)
+        denoised = denoise_bilateral(small, sigma_color=0.05, sigma_spatial=15 / 4)
+        return cv2.resize(denoised.astype(np.float32), (width, height), interpolation=cv2.INTER_LINEAR)
+    raise ValueError(f"Unknown denoise backend {backend!r}; expected one of {DENOISE_BACKENDS}")
+
+def create_scikit_image_version(gray, denoise_backend=DENOISE_BACKEND):
     """
     Applies Scikit-Image filters for image sharpening and manipulation.
 
     Args:
-        img (PIL.Image): The original image.
+        gray (np.ndarray): The 8-bit grayscale image (the graph's 'grayscale' stage).
+        denoise_backend (str): Denoising backend, one of DENOISE_BACKENDS.
 
     Returns:
         PIL.Image: The manipulated image.
     """
-    # Convert to grayscale (if necessary)
-    img = img.convert('L')
-    
-    # Convert to NumPy array
-    img_array = np.array(img)
-
-    # Apply bilateral denoising (preserves edges while reducing noise)
-    denoised_img = denoise_bilateral(img_array, sigma_color=0.05, sigma_spatial=15)
+    # Apply edge-preserving denoising (reduces noise while keeping text edges sharp)
+    denoised_img = denoise_image(gray, denoise_backend)
 
     # Normalize denoised image to range [0, 1]
     denoised_img = exposure.rescale_intensity(denoised_img, out_range=(0, 1))
@@ -81,7 +136,58 @@ def create_scikit_image_version(img):
     
     return Image.fromarray(final_img)
 
-def process_images(image_directory, excel_output_path):
+def scikit_variant_name(denoise_backend=DENOISE_BACKEND):
+    """
+    Names the scikit-image variant for a denoise backend (the original backend keeps the original name).
+
+    Args:
+        denoise_backend (str): Denoising backend, one of DENOISE_BACKENDS.
+
+    Returns:
+        str: The variant name used for graph stages and OCR cache keys.
+    """
+    if denoise_backend == 'skimage':
+        return 'scikit_denoise_sobel'
+    return f'scikit_denoise_sobel_{denoise_backend}'
+
+def build_preprocessing_graph(denoise_backends=(DENOISE_BACKEND,), resolution_profile=RESOLUTION_PROFILE):
+    """
+    Builds the preprocessing graph: all variants share one decode and grayscale conversion.
+
+    Args:
+        denoise_backends (tuple): Denoise backends to add a scikit-image variant for.
+        resolution_profile (str or None): Resolution profile applied after decoding.
+
+    Returns:
+        PreprocessingGraph: The graph with the 'adaptive_threshold' stage and one
+        scikit_variant_name(backend) stage per backend.
+    """
+    graph = build_default_graph(resolution_profile)
+    graph.add_stage('adaptive_threshold', preprocess_image, 'grayscale')
+    for backend in denoise_backends:
+        graph.add_stage(scikit_variant_name(backend),
+                        lambda gray, backend=backend: create_scikit_image_version(gray, backend), 'grayscale')
+    return graph
+
+def ocr_cached(cache, image_hash, variant, compute):
+    """
+    Returns cached Tesseract text for an image/preprocessing variant, running compute() on a miss.
+
+    Args:
+        cache (OCRCache or None): The OCR result cache, or None to always run compute().
+        image_hash (str): SHA-256 of the image file bytes.
+        variant (str): Name of the preprocessing variant.
+        compute (callable): Runs the preprocessing and OCR, returning the text.
+
+    Returns:
+        str: The extracted text.
+    """
+    if cache is None:
+        return compute()
+    key = make_key(image_hash, 'pytesseract', ('eng',), resolution_variant(variant, RESOLUTION_PROFILE))
+    return cache.get_or_compute(key, compute)
+
+def process_images(image_directory, excel_output_path, cache=None):
     # Normalize path (expands ~ to the full user path)
     image_directory = os.path.expanduser(image_directory)
 
@@ -95,20 +201,29 @@ def process_images(image_directory, excel_output_path):
     # List to store results for Excel export
     results = []
 
+    # One long-lived Tesseract worker, so the language model is loaded once rather than twice per image
+    tesseract = get_default_pool(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
+
+    # Decode and grayscale each image once for both preprocessing variants
+    graph = build_preprocessing_graph()
+
     for image_file in image_files:
         image_path = os.path.join(image_directory, image_file)
         try:
-            img = Image.open(image_path)
+            stages = graph.evaluate(image_path)
 
-            # Extract text from original image
-            original_img = preprocess_image(img.copy())
-            original_text = pytesseract.image_to_string(original_img)
+            # Re-use the text from an earlier run over the same image bytes
+            image_hash = hash_file(image_path) if cache is not None else None
 
-            # Create manipulated image
-            manipulated_img = create_scikit_image_version(img.copy())
+            # Extract text from original image
+            def read_original():
+                return tesseract.image_to_string(stages['adaptive_threshold'])
+            original_text = ocr_cached(cache, image_hash, 'adaptive_threshold', read_original)
 
-            # Extract text from manipulated image
-            manipulated_text = pytesseract.image_to_string(manipulated_img)
+            # Create manipulated image and extract text from it
+            def read_manipulated():
+                return tesseract.image_to_string(stages[scikit_variant_name()])
+            manipulated_text = ocr_cached(cache, image_hash, scikit_variant_name(), read_manipulated)
 
             # Append the results to the list (image file, original text, manipulated text)
             results.append({
@@ -130,9 +245,73 @@ def process_images(image_directory, excel_output_path):
 
     print(f"Results successfully exported to {excel_output_path}")
 
+def denoise_parity_check(image_directory, backends=DENOISE_BACKENDS, reference='skimage'):
+    """
+    Compares the denoise backends on a folder: preprocessing time and OCR word counts versus the reference.
+
+    Args:
+        image_directory (str): Directory of images to compare on.
+        backends (tuple): Denoise backends to compare (the reference is always included).
+        reference (str): Backend whose output the others are compared against.
+
+    Returns:
+        pd.DataFrame: One row per image and backend with seconds, words and the word-count delta.
+    """
+    image_directory = os.path.expanduser(image_directory)
+    image_files = [f for f in os.listdir(image_directory)
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+    backends = [reference] + [backend for backend in backends if backend != reference]
+
+    tesseract = get_default_pool(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
+    graph = build_preprocessing_graph(backends)
+
+    rows = []
+    for image_file in image_files:
+        try:
+            # Every backend starts from the same decoded grayscale image; compute it up front (stages
+            # are lazy) so decoding isn't counted in the first backend's time
+            stages = graph.evaluate(os.path.join(image_directory, image_file))
+            _ = stages['grayscale']
+
+            reference_words = None
+            for backend in backends:
+                start = time.perf_counter()
+                manipulated_img = stages[scikit_variant_name(backend)]
+                seconds = time.perf_counter() - start
+                words = len(tesseract.image_to_string(manipulated_img).split())
+                if backend == reference:
+                    reference_words = words
+                rows.append({'Image File': image_file, 'Backend': backend, 'Seconds': seconds,
+                             'Words': words, 'Word Delta': words - reference_words})
+        except Exception as e:
+            print(f"Failed to process {image_file}: {e}")
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        print("No images could be compared.")
+        return df
+
+    # Per backend: total time, speedup over the reference and how far the word counts moved
+    summary = df.groupby('Backend', sort=False).agg(
+        seconds=('Seconds', 'sum'), words=('Words', 'sum'),
+        mean_abs_word_delta=('Word Delta', lambda delta: delta.abs().mean()),
+        images_changed=('Word Delta', lambda delta: int((delta != 0).sum())))
+    summary['speedup'] = summary.loc[reference, 'seconds'] / summary['seconds']
+    print(summary.to_string(float_format=lambda value: f"{value:.2f}"))
+    return df
+
 # Set the path using expanduser
 image_directory = '~/Downloads/FilesImage'
 excel_output_path = '~/Downloads/extracted_text_results.xlsx'  # Path to save Excel file
 
-process_images(image_directory, excel_output_path)
+# Persistent OCR result cache shared with the other OCR scripts
+cache = OCRCache()
+
+# Set to True to compare the denoise backends on this folder instead of exporting results
+RUN_DENOISE_PARITY_CHECK = False
+
+if RUN_DENOISE_PARITY_CHECK:
+    denoise_parity_check(image_directory)
+else:
+    process_images(image_directory, excel_output_path, cache)
 
@@ -1,30 +1,106 @@
+import os
 import pandas as pd
-from googletrans import Translator
+from spreadsheet_stream import ChunkCheckpoint, iter_spreadsheet_chunks, write_chunks_to_csv, write_chunks_to_excel
+from translation_engine import create_engine
+from translation_memory import TranslationMemory
 
 file_location = r'C:\Users\bbgri\OneDrive\Documents\Mason\DAEN-690-Aug2024\Innovation_list_search_results7.xlsx'
 file_output = r'C:\Users\bbgri\OneDrive\Documents\Mason\DAEN-690-Aug2024\Output7.xlsx'
 
-df = pd.read_excel(file_location)
+# Columns translated from Chinese to English
+TRANSLATE_COLUMNS = ['Query', 'Title', 'Snippet']
 
-df = df.drop(df[df.Snippet == 'No snippet available'].index)
+# Translation backend: 'googletrans' (online) or 'marian' (a local model, for nodes without internet
+# access). Set TRANSLATION_BACKEND / MARIAN_MODEL / TRANSLATION_THREADS in the environment to switch
+# without editing the script; MARIAN_MODEL can be a downloaded model directory
+TRANSLATION_BACKEND = os.environ.get('TRANSLATION_BACKEND', 'googletrans')
+MARIAN_MODEL = os.environ.get('MARIAN_MODEL', 'Helsinki-NLP/opus-mt-zh-en')
+TRANSLATION_THREADS = int(os.environ.get('TRANSLATION_THREADS', 0)) or None  # PyTorch CPU threads (None = all)
 
+# Distinct strings per worker batch, and how many batches may be translated at once
+# (None = the backend's defaults: 25 and 4 for googletrans, 256 and 1 for marian)
+TRANSLATION_BATCH_SIZE = None
+TRANSLATION_WORKERS = None
 
-def translate_df(df, column_name):
-    translator = Translator()
+# Re-use translations from earlier runs (stored in ~/.gru_translation_memory.sqlite3), so files that
+# overlap earlier ones only pay for their new strings
+USE_TRANSLATION_MEMORY = True
 
-    def translate_text(text):
-        try:
-            translation = translator.translate(text, src='zh-cn', dest='en')
-            return translation.text
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text
+# Only cells whose non-space characters are at least this share Chinese are sent to the translator
+# (0 = any Chinese character); cells that are already English, numbers or URLs are kept as they are.
+# None sends every text cell
+TRANSLATION_MIN_CJK_RATIO = 0.0
 
-    df[column_name] = df[column_name].apply(translate_text)
+# Rows read, translated and checkpointed at a time, so memory stays bounded and an interrupted run
+# resumes at the last finished chunk (finished chunks are kept in "<output>.chunks" until the output
+# is written). 0 loads and translates the whole workbook at once
+STREAM_CHUNK_ROWS = 5000
+
+
+# Function to create the translation engine configured above
+def make_engine():
+    memory = TranslationMemory() if USE_TRANSLATION_MEMORY else None
+    return create_engine(TRANSLATION_BACKEND, src='zh-cn', dest='en', batch_size=TRANSLATION_BATCH_SIZE,
+                         max_workers=TRANSLATION_WORKERS, memory=memory, model=MARIAN_MODEL,
+                         threads=TRANSLATION_THREADS, min_cjk_ratio=TRANSLATION_MIN_CJK_RATIO)
+
+
+# Function to drop the search results that carry no text
+def drop_empty_results(df):
+    return df.drop(df[df.Snippet == 'No snippet available'].index)
+
+
+# Function to print the engine's totals so far
+def print_translation_summary(engine):
+    print(f"Translated {engine.stats['unique']} unique strings for {engine.stats['cells']} cells "
+          f"({engine.stats['skipped']} cells without Chinese text skipped, "
+          f"{engine.stats['memory_hits']} from the translation memory) "
+          f"in {engine.stats['requests']} translator calls ({engine.stats['errors']} errors), "
+          f"{engine.sentences_per_second:.1f} sentences/sec with {engine.backend}")
+
+
+def translate_df(df, column_names, engine=None):
+    # Each distinct string across all the columns is translated once and mapped back to every row
+    if isinstance(column_names, str):
+        column_names = [column_names]
+    if engine is None:
+        engine = make_engine()
+    df = engine.translate_columns(df, column_names)
+    print_translation_summary(engine)
     return df
 
 
-df = translate_df(df, 'Query')
-df = translate_df(df, 'Title')
-df = translate_df(df, 'Snippet')
-df.to_excel(file_output)
\ No newline at end of file
+# Function to translate a large spreadsheet chunk by chunk, checkpointing each finished chunk
+def translate_file_in_chunks(input_path, output_path, column_names, chunk_rows=STREAM_CHUNK_ROWS, engine=None):
+    if engine is None:
+        engine = make_engine()
+    settings = {'columns': column_names, 'chunk_rows': chunk_rows, 'backend': engine.backend,
+                'src': engine.src, 'dest': engine.dest, 'min_cjk_ratio': engine.min_cjk_ratio}
+    checkpoint = ChunkCheckpoint(output_path + '.chunks', input_path, settings)
+    if checkpoint.completed:
+        print(f"Resuming after {checkpoint.completed} finished chunks ({checkpoint.completed * chunk_rows} rows)")
+
+    for number, df in iter_spreadsheet_chunks(input_path, chunk_rows, skip_chunks=checkpoint.completed):
+        df = engine.translate_columns(drop_empty_results(df), column_names)
+        checkpoint.save_chunk(number, df)
+        print(f"Chunk {number + 1}: {len(df)} rows translated and checkpointed")
+    print_translation_summary(engine)
+
+    # Stream the finished chunks into the output, then discard them
+    if output_path.lower().endswith('.csv'):
+        write_chunks_to_csv(checkpoint.iter_chunks(), output_path)
+    else:
+        write_chunks_to_excel(checkpoint.iter_chunks(), output_path)
+    checkpoint.clear()
+
+
+if __name__ == "__main__":
+    if STREAM_CHUNK_ROWS:
+        translate_file_in_chunks(file_location, file_output, TRANSLATE_COLUMNS, STREAM_CHUNK_ROWS)
+    else:
+        df = pd.read_excel(file_location)
+
+        df = drop_empty_results(df)
+
+        df = translate_df(df, TRANSLATE_COLUMNS)
+        df.to_excel(file_output)
@@ -0,0 +1,195 @@
+"""
+Shared EasyOCR helpers used by EasyOCR.py and sharpen_comparison.py (Pillow_preprocessing.py, pyTorch.py).
+
+The Simplified and Traditional Chinese readers share a single CRAFT detector: only
+reader_simplified loads detection weights, each image is detected once, and the
+Traditional Chinese fallback re-uses those text boxes for recognition only.
+
+readtext_shared_batched does the same over a list of images: images are grouped by
+similar size, padded to a common canvas and detected a whole batch per forward pass.
+
+Both take an optional resolution profile (see resolution.py): images are normalized before
+detection and the returned boxes are mapped back to original image coordinates.
+
+recognize_regions re-reads boxes that are already known (e.g. those found on the original
+image) on another version of the same image, such as a sharpened one, without detecting again.
+
+needs_second_pass gates the scripts' sharpened-image pass, so it only runs when the
+original pass came back empty, low-confidence or full of spelling errors.
+"""
+import math
+import cv2
+import numpy as np
+import easyocr
+from easyocr.utils import reformat_input
+from PIL import Image
+from ocr_cache import make_key
+from resolution import map_box_to_original, normalize_resolution
+
+# Languages covered by the reader pair, used as part of the OCR cache key
+EASYOCR_LANGUAGES = ('en', 'ch_sim', 'ch_tra')
+
+# Function to build the Simplified/Traditional Chinese readers with one shared detector
+def build_readers():
+    reader_simplified = easyocr.Reader(['en', 'ch_sim'], verbose=False)
+    # The Traditional Chinese reader only ever recognizes, so skip loading a second detector
+    reader_traditional = easyocr.Reader(['en', 'ch_tra'], detector=False, verbose=False)
+    return reader_simplified, reader_traditional
+
+# Function to decode an image (file path, NumPy array or raw bytes) into the (image, grayscale) pair that
+# detection and recognition work on; the pair can be passed in place of the image, e.g. to decode ahead of time.
+# Colour arrays are taken as RGB (PIL's order): reformat_input assumes BGR and would weight red and blue
+# the wrong way round in the grayscale the recognizer reads
+def prepare_input(image):
+    if isinstance(image, np.ndarray) and image.ndim == 3 and image.shape[2] in (3, 4):
+        img = image[:, :, :3]
+        return img, cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return reformat_input(image)
+
+# Function to run a single detection pass and return the grayscale image and its text boxes
+def detect_text(reader, image):
+    # image can be a file path, a NumPy array or raw bytes, same as reader.readtext, or a prepare_input pair
+    img, img_cv_grey = image if isinstance(image, tuple) else prepare_input(image)
+    horizontal_list, free_list = reader.detect(img, reformat=False)
+    # detect returns one list per image, we only passed one
+    return img_cv_grey, horizontal_list[0], free_list[0]
+
+# Function to recognize already-detected text boxes with one reader
+def recognize_boxes(reader, img_cv_grey, horizontal_list, free_list, batch_size=1):
+    if not horizontal_list and not free_list:
+        return []
+    return reader.recognize(img_cv_grey, horizontal_list, free_list, batch_size=batch_size,
+                            detail=1, reformat=False)
+
+# Function to load an image (file path or NumPy array) and normalize it for a resolution profile,
+# returning (image, scale)
+def load_normalized(image, profile):
+    if not isinstance(image, np.ndarray):
+        with Image.open(image) as img:
+            image = np.array(img.convert('RGB'))
+    return normalize_resolution(image, profile)
+
+# Function to map (box, text, confidence) results from a normalized image back to original coordinates
+def map_results_to_original(results, scale):
+    return [(map_box_to_original(box, scale), text, confidence) for box, text, confidence in results]
+
+# Function to read text with the Simplified reader, falling back to Traditional on the same boxes
+def readtext_shared(reader_simplified, reader_traditional, image, profile=None):
+    if profile is not None:
+        image, scale = load_normalized(image, profile)
+
+    img_cv_grey, horizontal_list, free_list = detect_text(reader_simplified, image)
+    results = recognize_boxes(reader_simplified, img_cv_grey, horizontal_list, free_list)
+
+    # Fallback to Traditional Chinese reader if no text is found (recognition only)
+    if not results:
+        results = recognize_boxes(reader_traditional, img_cv_grey, horizontal_list, free_list)
+
+    if profile is not None:
+        results = map_results_to_original(results, scale)
+    return results
+
+# Function to turn result boxes back into the detector's horizontal_list (axis-aligned
+# [x_min, x_max, y_min, y_max]) and free_list (four [x, y] corners) formats
+def boxes_to_regions(boxes):
+    horizontal_list, free_list = [], []
+    for box in boxes:
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = box
+        if y0 == y1 and x1 == x2 and y2 == y3 and x3 == x0:
+            horizontal_list.append([int(x0), int(x1), int(y0), int(y2)])
+        else:
+            free_list.append([[float(x), float(y)] for x, y in box])
+    return horizontal_list, free_list
+
+# Function to recognize known text boxes (in original image coordinates) on an image, skipping detection
+def recognize_regions(reader_simplified, reader_traditional, image, boxes, profile=None):
+    if profile is not None:
+        image, scale = load_normalized(image, profile)
+        boxes = [map_box_to_original(box, 1 / scale) for box in boxes]
+
+    # image may be a file path, an RGB array (e.g. from EasyOCR.sharpen_regions) or a prepare_input pair
+    _, img_cv_grey = image if isinstance(image, tuple) else prepare_input(image)
+    horizontal_list, free_list = boxes_to_regions(boxes)
+    results = recognize_boxes(reader_simplified, img_cv_grey, horizontal_list, free_list)
+
+    # Fallback to Traditional Chinese reader if no text is found
+    if not results:
+        results = recognize_boxes(reader_traditional, img_cv_grey, horizontal_list, free_list)
+
+    if profile is not None:
+        results = map_results_to_original(results, scale)
+    return results
+
+# Function to return cached EasyOCR results for an image/variant, computing them on a miss
+def readtext_cached(cache, image_hash, variant, compute):
+    if cache is None:
+        return compute()
+    key = make_key(image_hash, 'easyocr', EASYOCR_LANGUAGES, variant)
+    cached = cache.get(key)
+    if cached is not None:
+        # JSON turns the (box, text, confidence) tuples into lists
+        return [tuple(res) for res in cached]
+    results = compute()
+    cache.put(key, results)
+    return results
+
+# Function to group image indices by size, rounded up to the nearest size_step pixels
+def group_by_size(images, size_step=64):
+    groups = {}
+    for index, img in enumerate(images):
+        height, width = img.shape[:2]
+        key = (math.ceil(height / size_step) * size_step, math.ceil(width / size_step) * size_step)
+        groups.setdefault(key, []).append(index)
+    return groups
+
+# Function to pad an image on the bottom/right so every image in a group has the same shape
+def pad_to_size(img, height, width):
+    padded = np.zeros((height, width) + img.shape[2:], dtype=img.dtype)
+    padded[:img.shape[0], :img.shape[1]] = img
+    return padded
+
+# Function to read text from a list of images, detecting each same-size group in batches
+def readtext_shared_batched(reader_simplified, reader_traditional, images, batch_size=8, size_step=64,
+                            profile=None):
+    # Normalize the resolution first if asked, remembering each image's scale
+    scales = [1.0] * len(images)
+    if profile is not None:
+        images = list(images)
+        for i, image in enumerate(images):
+            images[i], scales[i] = load_normalized(image, profile)
+
+    # Decode everything once; each entry is (colour image, grayscale image)
+    prepared = [image if isinstance(image, tuple) else prepare_input(image) for image in images]
+    results = [None] * len(prepared)
+
+    for (height, width), indices in group_by_size([img for img, _ in prepared], size_step).items():
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            stacked = np.stack([pad_to_size(prepared[i][0], height, width) for i in batch])
+
+            # One detector forward pass for the whole batch; padding sits below/right of the
+            # original pixels, so the boxes are already in original image coordinates
+            horizontal_lists, free_lists = reader_simplified.detect(stacked, reformat=False)
+
+            for i, horizontal_list, free_list in zip(batch, horizontal_lists, free_lists):
+                img_cv_grey = prepared[i][1]
+                image_results = recognize_boxes(reader_simplified, img_cv_grey, horizontal_list,
+                                                free_list, batch_size)
+                if not image_results:
+                    image_results = recognize_boxes(reader_traditional, img_cv_grey, horizontal_list,
+                                                    free_list, batch_size)
+                results[i] = map_results_to_original(image_results, scales[i])
+
+    return results
+
+# Text shown in place of the sharpened-image results when the gated second pass was not needed
+SECOND_PASS_SKIPPED = "Skipped (original pass confident)"
+
+# Function to decide whether the first pass is unreliable enough to also OCR the sharpened image:
+# no text found, average confidence below min_confidence, or too many spelling errors
+def needs_second_pass(confidences, min_confidence=0.6, spell_error_rate=0.0, max_spell_error_rate=None):
+    if not confidences:
+        return True
+    if sum(confidences) / len(confidences) < min_confidence:
+        return True
+    return max_spell_error_rate is not None and spell_error_rate > max_spell_error_rate
@@ -0,0 +1,171 @@
+"""
+Excel export helpers shared by the OCR scripts.
+
+ExcelResultsWriter appends one row (plus its embedded images) at a time. In streaming mode
+it uses openpyxl's write-only workbooks, so cell data is flushed to disk as rows arrive.
+Embedded images are only written out when a workbook is saved, so the writer rolls over to
+a new workbook (results_part2.xlsx, results_part3.xlsx, ...) once the current one holds too
+many rows or image bytes. That keeps memory bounded on very large folders.
+
+Images are embedded according to image_mode:
+    'thumbnail' - a JPEG generated in memory at the displayed size (the default; keeps
+                  workbooks small and fast to save/open even for folders of large photos)
+    'embed'     - the full original file, scaled only for display
+    'link'      - a HYPERLINK to the original file instead of an embedded image
+"""
+import os
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as ExcelImage
+from openpyxl.utils import column_index_from_string
+
+# Roll over to a new workbook after this many data rows or bytes of embedded images
+MAX_ROWS_PER_WORKBOOK = 10000
+MAX_IMAGE_BYTES_PER_WORKBOOK = 200 * 1024 * 1024
+
+IMAGE_MODES = ('thumbnail', 'embed', 'link')
+THUMBNAIL_JPEG_QUALITY = 75
+
+
+# Function to estimate how many bytes an embedded image source will add to the workbook
+def image_source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer().nbytes
+    return 0
+
+
+# Function to render an image (file path or BytesIO) as an in-memory JPEG at the displayed size
+def make_thumbnail(source, width, height, quality=THUMBNAIL_JPEG_QUALITY):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale while decoding, much faster for large photos
+        img.draft('RGB', (width, height))
+        thumbnail = img.convert('RGB').resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+    buffer = BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+# Function to build a HYPERLINK formula pointing at an original image file
+def link_formula(path):
+    target = Path(os.path.abspath(path)).as_uri().replace('"', '""')
+    label = os.path.basename(path).replace('"', '""')
+    return f'=HYPERLINK("{target}", "{label}")'
+
+
+class ExcelResultsWriter:
+    """Append-only Excel writer with an optional streaming (write-only, multi-workbook) mode."""
+
+    def __init__(self, path, headers, column_widths=None, sheet_title="OCR Results", streaming=False,
+                 max_rows=MAX_ROWS_PER_WORKBOOK, max_image_bytes=MAX_IMAGE_BYTES_PER_WORKBOOK,
+                 image_mode='thumbnail', thumbnail_quality=THUMBNAIL_JPEG_QUALITY):
+        if image_mode not in IMAGE_MODES:
+            raise ValueError(f"image_mode must be one of {IMAGE_MODES}, not {image_mode!r}")
+        self.path = path
+        self.headers = headers
+        self.column_widths = column_widths or {}
+        self.sheet_title = sheet_title
+        self.streaming = streaming
+        self.max_rows = max_rows
+        self.max_image_bytes = max_image_bytes
+        self.image_mode = image_mode
+        self.thumbnail_quality = thumbnail_quality
+        self.saved_paths = []  # Every workbook written so far
+        self.part = 0
+        self._open_workbook()
+
+    # Start a new workbook (the first one uses path, later ones get a _partN suffix)
+    def _open_workbook(self):
+        self.part += 1
+        if self.part == 1:
+            self.current_path = self.path
+        else:
+            base, ext = os.path.splitext(self.path)
+            self.current_path = f"{base}_part{self.part}{ext}"
+
+        if self.streaming:
+            self.wb = Workbook(write_only=True)
+            self.ws = self.wb.create_sheet(self.sheet_title)
+        else:
+            self.wb = Workbook()
+            self.ws = self.wb.active
+            self.ws.title = self.sheet_title
+
+        # Column widths must be set before any rows are written in write-only mode
+        for column, width in self.column_widths.items():
+            self.ws.column_dimensions[column].width = width
+
+        self.ws.append(self.headers)
+        self.row = 1  # Last row written
+        self.image_bytes = 0
+        self._row_started = False
+        self._row_links = {}  # Column letter -> HYPERLINK formula for the next row
+        self._row_has_image = False
+
+    # Roll over to a new workbook before starting a row if the current one is full
+    def _start_row(self):
+        if self._row_started:
+            return
+        if self.streaming and (self.row - 1 >= self.max_rows or self.image_bytes >= self.max_image_bytes):
+            self.save()
+            self._open_workbook()
+        self._row_started = True
+
+    def add_image(self, column, source, width, height):
+        """Embed an image (file path or BytesIO) in the given column of the next row to be appended."""
+        self._start_row()
+        if self.image_mode == 'link' and isinstance(source, (str, os.PathLike)):
+            # Link to the original file instead of embedding it
+            self._row_links[column] = link_formula(source)
+            return
+        if self.image_mode != 'embed':
+            source = make_thumbnail(source, width, height, self.thumbnail_quality)
+
+        img = ExcelImage(source)
+        img.width, img.height = width, height
+        self.ws.add_image(img, f'{column}{self.row + 1}')
+        self.image_bytes += image_source_size(source)
+        self._row_has_image = True
+
+    def append(self, values, row_height=None):
+        """Write the next row of values, returning its row number in the current workbook."""
+        self._start_row()
+        self.row += 1
+
+        values = list(values)
+        for column, formula in self._row_links.items():
+            index = column_index_from_string(column) - 1
+            values.extend([None] * (index + 1 - len(values)))
+            values[index] = formula
+            # Rows without an embedded image don't need to be image-height
+            if not self._row_has_image:
+                row_height = None
+
+        # Row heights must be set before the row itself is written in write-only mode
+        if row_height is not None:
+            self.ws.row_dimensions[self.row].height = row_height
+        self.ws.append(values)
+        self._row_started = False
+        self._row_links = {}
+        self._row_has_image = False
+        return self.row
+
+    def save(self):
+        """Save the current workbook; in streaming mode this also releases its images."""
+        self.wb.save(self.current_path)
+        self.saved_paths.append(self.current_path)
+        self.wb = None
+        self.ws = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.wb is not None:
+            self.save()
@@ -0,0 +1,94 @@
+"""
+Offline Chinese -> English translation with a local Marian (Hugging Face transformers) model.
+
+For processing nodes without internet access, where googletrans can't be used. The model is
+loaded once and translates on the CPU in batches. Sentences are sorted by length first, so
+each batch pads to similar lengths, and the results are put back in input order. The number
+of PyTorch threads is configurable, and the translator reports its sentences/sec.
+
+MarianTranslator has googletrans' translate(text_or_list, src=, dest=) interface, so
+TranslationEngine uses it like any other translator. The model fixes the language pair.
+
+Needs `pip install transformers sentencepiece`. On an air-gapped node, download the model
+elsewhere (e.g. `huggingface-cli download Helsinki-NLP/opus-mt-zh-en --local-dir opus-mt-zh-en`),
+copy the directory over and pass its path as the model name.
+"""
+import threading
+import time
+
+DEFAULT_MODEL = 'Helsinki-NLP/opus-mt-zh-en'
+DEFAULT_BATCH_SIZE = 32
+
+# Longest input, in tokens, the Marian models accept; longer text is truncated
+MAX_INPUT_TOKENS = 512
+
+
+class Translation:
+    """One translation result, with the same attributes as googletrans' Translated."""
+
+    def __init__(self, origin, text, src, dest):
+        self.origin = origin
+        self.text = text
+        self.src = src
+        self.dest = dest
+
+
+class MarianTranslator:
+    """A Marian translation model loaded once, translating length-sorted batches on the CPU."""
+
+    def __init__(self, model_name=DEFAULT_MODEL, num_threads=None, batch_size=DEFAULT_BATCH_SIZE, num_beams=None):
+        import torch
+        from transformers import MarianMTModel, MarianTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.model_name = model_name
+        self.batch_size = batch_size
+        # None keeps the model's own beam setting; 1 (greedy) is fastest
+        self.num_beams = num_beams
+        self.tokenizer = MarianTokenizer.from_pretrained(model_name)
+        self.model = MarianMTModel.from_pretrained(model_name).eval()
+
+        # Several engine workers share the one model, so their batches take turns
+        self._lock = threading.Lock()
+
+        # Throughput stats
+        self.sentences_translated = 0
+        self.seconds_spent = 0.0
+
+    @property
+    def sentences_per_second(self):
+        return self.sentences_translated / self.seconds_spent if self.seconds_spent else 0.0
+
+    def translate_texts(self, texts):
+        """Translate a list of strings, returning the translated strings in the same order."""
+        with self._lock:
+            return self._translate_texts(texts)
+
+    def _translate_texts(self, texts):
+        start = time.perf_counter()
+        # Sort by length so each batch pads to similar lengths, then restore the input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        translated = [None] * len(texts)
+
+        generate_options = {} if self.num_beams is None else {'num_beams': self.num_beams}
+        with self.torch.inference_mode():
+            for begin in range(0, len(order), self.batch_size):
+                batch = order[begin:begin + self.batch_size]
+                inputs = self.tokenizer([texts[i] for i in batch], return_tensors='pt', padding=True,
+                                        truncation=True, max_length=MAX_INPUT_TOKENS)
+                outputs = self.model.generate(**inputs, **generate_options)
+                for i, text in zip(batch, self.tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                    translated[i] = text
+
+        self.sentences_translated += len(texts)
+        self.seconds_spent += time.perf_counter() - start
+        return translated
+
+    def translate(self, text, src='zh-cn', dest='en'):
+        """googletrans-style translate: a string gives one Translation, a list gives a list of them."""
+        if isinstance(text, str):
+            return Translation(text, self.translate_texts([text])[0], src, dest)
+        texts = list(text)
+        return [Translation(origin, result, src, dest) for origin, result in zip(texts, self.translate_texts(texts))]
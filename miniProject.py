@@ -1,12 +1,23 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from PIL import Image
 import pytesseract
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as XLImage
+from excel_export import ExcelResultsWriter
+from ocr_cache import OCRCache, hash_file, make_key
+from resolution import normalize_resolution, resolution_variant
+from tesseract_pool import get_default_pool
 
 # Update the path to your Tesseract-OCR executable
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'  # Update this path as needed
 
+# Resolution profile applied before OCR (see resolution.py): 'tesseract' scales huge photos down and
+# tiny crops up; None OCRs images at their own size
+RESOLUTION_PROFILE = None
+
+# Stream rows to write-only workbooks as images are processed (recommended for very large folders)
+STREAMING_EXPORT = False
+
 def resize_image(image_path, max_width, max_height):
     """Resize image to fit within max_width x max_height while preserving aspect ratio."""
     try:
@@ -17,12 +28,26 @@ def resize_image(image_path, max_width, max_height):
         print(f"Error resizing image {os.path.basename(image_path)}: {e}")
         return None
 
-def extract_text_from_image(image_path):
-    """Extract text from an image using pytesseract OCR."""
+def extract_text_from_image(image_path, cache=None, profile=None):
+    """Extract text from an image using Tesseract OCR, re-using cached results when a cache is given."""
     try:
+        if cache is not None:
+            key = make_key(hash_file(image_path), 'pytesseract', ('eng',), resolution_variant('original', profile))
+            text = cache.get(key)
+            if text is not None:
+                return text
+
+        # Each process keeps one long-lived Tesseract worker instead of starting tesseract per image
+        tesseract = get_default_pool(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
         with Image.open(image_path) as img:
-            text = pytesseract.image_to_string(img)
-            return text.strip()
+            # Scale huge photos down / tiny crops up for the Tesseract profile
+            if profile is not None:
+                img, _ = normalize_resolution(img, profile)
+            text = tesseract.image_to_string(img).strip()
+
+        if cache is not None:
+            cache.put(key, text)
+        return text
     except Exception as e:
         print(f"Cannot extract text from image {os.path.basename(image_path)}. Error: {e}")
         return ""
@@ -43,32 +68,63 @@ def get_output_file_name(image_directory, output_file_name):
         else:
             return output_excel_file
 
-def images_to_excel(image_directory, output_file_name):
+def process_image(image_directory, image_file, cache=None, profile=None):
+    """Resize, save the thumbnail and OCR a single image; safe to run in a worker process."""
+    # Construct the full file path
+    image_path = os.path.join(image_directory, image_file)
+
+    # Define the temporary image file path
+    temp_img_path = os.path.join(image_directory, f'temp_{image_file}')
+    result = {'image_file': image_file, 'temp_img_path': None, 'status': 'Corrupted'}
+
+    try:
+        # Resize the image
+        img = resize_image(image_path, 180, 100)  # Adjust max_width and max_height as needed
+
+        if img is None:
+            print(f"Image is corrupted or cannot be opened: {image_file}")
+            return result
+
+        # Save the image temporarily for openpyxl to use
+        result['temp_img_path'] = temp_img_path
+        img.save(temp_img_path)
+        print(f"Processing: {image_file}")  # Changed print statement to show only the image name
+    except (IOError, SyntaxError, AttributeError) as e:
+        print(f"Cannot open or save image file: {image_file}. Error: {e}")
+        return result
+
+    # Extract text from the image
+    result['text'] = extract_text_from_image(image_path, cache, profile)
+
+    # Extract image dimensions and format
+    result['width'], result['height'] = img.size
+    result['format'] = img.format
+    result['status'] = 'OK'
+    return result
+
+def process_images(image_directory, image_files, max_workers=1, cache=None, profile=None):
+    """Yield process_image results in the order of image_files, using a process pool when max_workers > 1."""
+    if max_workers is not None and max_workers <= 1:
+        for image_file in image_files:
+            yield process_image(image_directory, image_file, cache, profile)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # executor.map hands results back in submission order, so rows stay deterministic
+        yield from executor.map(process_image, repeat(image_directory), image_files, repeat(cache), repeat(profile))
+
+def images_to_excel(image_directory, output_file_name, max_workers=1, cache=None, streaming=False, profile=None):
     # Get the output file path with user choice to overwrite or rename
     output_excel_file = get_output_file_name(image_directory, output_file_name)
 
-    # Create a new workbook and select the active worksheet
-    wb = Workbook()
-    ws = wb.active
-
-    # Set column widths
-    ws.column_dimensions['A'].width = 30  # Images column
-    ws.column_dimensions['B'].width = 20  # File Names column
-    ws.column_dimensions['C'].width = 25  # Image Dimensions column
-    ws.column_dimensions['D'].width = 15  # Formats column
-    ws.column_dimensions['E'].width = 50  # Extracted Text column
-    ws.column_dimensions['F'].width = 15  # Status column
-
-    # Add headers
-    ws['A1'] = 'Images'
-    ws['B1'] = 'File Names'
-    ws['C1'] = 'Image Dimensions'
-    ws['D1'] = 'Formats'
-    ws['E1'] = 'Extracted Text'
-    ws['F1'] = 'Status'
-
-    # Initial row for data
-    row = 2
+    # Create a new workbook (write-only and split across files in streaming mode) with headers
+    # and column widths: Images, File Names, Image Dimensions, Formats, Extracted Text, Status
+    writer = ExcelResultsWriter(output_excel_file,
+                                ['Images', 'File Names', 'Image Dimensions', 'Formats', 'Extracted Text', 'Status'],
+                                {'A': 30, 'B': 20, 'C': 25, 'D': 15, 'E': 50, 'F': 15},
+                                sheet_title='Sheet', streaming=streaming,
+                                image_mode='embed')  # The temp images are already display-size thumbnails
+
     temp_files = []  # List to keep track of temporary files
 
     # Get a list of image files in the directory
@@ -85,81 +141,40 @@ def images_to_excel(image_directory, output_file_name):
         print(f"Directory not found: {image_directory}")
         return
 
-    for image_file in image_files:
-        # Construct the full file path
-        image_path = os.path.join(image_directory, image_file)
+    # Sort so rows come back in the same order no matter how many workers are used
+    image_files.sort()
 
-        # Define the temporary image file path
-        temp_img_path = os.path.join(image_directory, f'temp_{image_file}')
-        temp_files.append(temp_img_path)  # Add to list of temporary files
+    for result in process_images(image_directory, image_files, max_workers, cache, profile):
+        image_file = result['image_file']
+        if result['temp_img_path']:
+            temp_files.append(result['temp_img_path'])  # Add to list of temporary files
 
-        try:
-            # Resize the image
-            img = resize_image(image_path, 180, 100)  # Adjust max_width and max_height as needed
-
-            if img is None:
-                print(f"Image is corrupted or cannot be opened: {image_file}")
-                # Log data for corrupted images
-                ws[f'B{row}'] = image_file
-                ws[f'C{row}'] = 'NA'
-                ws[f'D{row}'] = 'NA'
-                ws[f'E{row}'] = 'NA'
-                ws[f'F{row}'] = 'Corrupted'
-                row += 1
-                continue
-
-            # Save the image temporarily for openpyxl to use
-            img.save(temp_img_path)
-            print(f"Processing: {image_file}")  # Changed print statement to show only the image name
-        except (IOError, SyntaxError, AttributeError) as e:
-            print(f"Cannot open or save image file: {image_file}. Error: {e}")
+        if result['status'] == 'Corrupted':
             # Log data for corrupted images
-            ws[f'B{row}'] = image_file
-            ws[f'C{row}'] = 'NA'
-            ws[f'D{row}'] = 'NA'
-            ws[f'E{row}'] = 'NA'
-            ws[f'F{row}'] = 'Corrupted'
-            row += 1
+            writer.append([None, image_file, 'NA', 'NA', 'NA', 'Corrupted'])
             continue
 
-        # Extract text from the image
-        text = extract_text_from_image(image_path)
-
-        # Extract image dimensions and format
-        img_width, img_height = img.size
-        img_format = img.format
+        img_width, img_height = result['width'], result['height']
+        img_format = result['format']
+        text = result['text']
 
         # Add image to the Excel sheet
         try:
-            excel_image = XLImage(temp_img_path)
-            excel_image.width = img.width
-            excel_image.height = img.height
-            ws.add_image(excel_image, f'A{row}')
-
-            # Add file name, dimensions, format, and extracted text to the Excel sheet
-            ws[f'B{row}'] = image_file
-            ws[f'C{row}'] = f'{img_width}x{img_height}'
-            ws[f'D{row}'] = img_format
-            ws[f'E{row}'] = text
-            ws[f'F{row}'] = 'OK'
-
-            # Adjust row height based on image height
-            ws.row_dimensions[row].height = img.height * 0.75  # Adjust factor as needed for padding
+            writer.add_image('A', result['temp_img_path'], img_width, img_height)
+            status = 'OK'
         except Exception as e:
             print(f"Cannot add image to Excel sheet: {image_file}. Error: {e}")
-            ws[f'B{row}'] = image_file
-            ws[f'C{row}'] = f'{img_width}x{img_height}'
-            ws[f'D{row}'] = img_format
-            ws[f'E{row}'] = text
-            ws[f'F{row}'] = 'Error Adding Image'
+            status = 'Error Adding Image'
 
-        # Move to the next row
-        row += 1
+        # Add file name, dimensions, format, and extracted text to the Excel sheet,
+        # adjusting the row height based on image height
+        row_height = img_height * 0.75 if status == 'OK' else None  # Adjust factor as needed for padding
+        writer.append([None, image_file, f'{img_width}x{img_height}', img_format, text, status], row_height)
 
     # Save the workbook
     try:
-        wb.save(output_excel_file)
-        print(f"Excel file created successfully: {os.path.basename(output_excel_file)}")
+        writer.save()
+        print(f"Excel file created successfully: {', '.join(os.path.basename(path) for path in writer.saved_paths)}")
     except IOError as e:
         print(f"Cannot save Excel file: {os.path.basename(output_excel_file)}. Error: {e}")
 
@@ -184,4 +199,10 @@ if __name__ == "__main__":
     else:
         # Prompt for the desired Excel file name
         output_file_name = input("Enter the desired name for the Excel file (without extension): ").strip()
-        images_to_excel(image_directory, output_file_name)
+
+        # Prompt for the number of worker processes (blank uses every CPU core)
+        workers_input = input("Enter the number of worker processes (leave blank to use all cores): ").strip()
+        max_workers = int(workers_input) if workers_input.isdigit() and int(workers_input) > 0 else None
+        # Re-use OCR results from earlier runs over the same images
+        cache = OCRCache()
+        images_to_excel(image_directory, output_file_name, max_workers, cache, STREAMING_EXPORT, RESOLUTION_PROFILE)
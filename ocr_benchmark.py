@@ -0,0 +1,282 @@
+"""
+Benchmark the repo's OCR engine / preprocessing combinations on the same image corpus.
+
+Each engine runs in its own fresh process, so model load time and peak memory are measured
+in isolation. Per engine this reports model load time, images/sec, per-image latency
+percentiles, peak RSS, words extracted and mean confidence (where the engine reports one),
+and writes everything to a JSON file for tracking regressions between runs.
+
+Usage:
+    python ocr_benchmark.py <image directory> [--engines easyocr pytesseract ...]
+                            [--limit N] [--warmup N] [--output benchmark.json]
+"""
+import argparse
+import ast
+import json
+import math
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from PIL import Image, ImageFilter
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+PERCENTILES = (50, 95, 99)
+
+
+# Function to load only the named functions (plus the imports and UPPER_CASE constants) from one of
+# the notebook scripts, which run their whole pipeline at import time and have spaces in their names
+def load_notebook_functions(filename, names):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    body = [node for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+            or (isinstance(node, ast.Assign)
+                and all(isinstance(target, ast.Name) and target.id.isupper() for target in node.targets))
+            or (isinstance(node, ast.FunctionDef) and node.name in names)]
+    namespace = {}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, 'exec'), namespace)
+    return namespace
+
+
+# Engine adapters: load() returns the engine state (timed as model load), and
+# ocr(state, image_path) returns a list of (text, confidence or None) elements
+def _load_tesseract(tesseract_cmd):
+    from tesseract_pool import TesseractPool
+    pool = TesseractPool(1, tesseract_cmd=tesseract_cmd)
+    # Start the worker (and load the language model) now rather than on the first image
+    pool.image_to_string(Image.new('L', (32, 32), 255))
+    return pool
+
+
+def load_pytesseract(tesseract_cmd=None):
+    return {'pool': _load_tesseract(tesseract_cmd)}
+
+
+def ocr_pytesseract(state, image_path):
+    with Image.open(image_path) as img:
+        return [(state['pool'].image_to_string(img), None)]
+
+
+def load_tesseract_opencv(tesseract_cmd=None):
+    functions = load_notebook_functions('PyTesseract OCR for GRU Minions with NumPy (OpenCV).py',
+                                        ['preprocess_image', 'build_preprocessing_graph'])
+    return {'pool': _load_tesseract(tesseract_cmd), 'graph': functions['build_preprocessing_graph']()}
+
+
+def ocr_tesseract_opencv(state, image_path):
+    img = state['graph'].evaluate(image_path)['opencv_adaptive_threshold']
+    return [(state['pool'].image_to_string(Image.fromarray(img)), None)]
+
+
+def load_tesseract_scikit(tesseract_cmd=None):
+    functions = load_notebook_functions('PyTesseract OCR for GRU Minions with Scikit-Image Features.py',
+                                        ['preprocess_image', 'guided_filter', 'denoise_image',
+                                         'create_scikit_image_version', 'scikit_variant_name',
+                                         'build_preprocessing_graph'])
+    return {'pool': _load_tesseract(tesseract_cmd), 'graph': functions['build_preprocessing_graph']()}
+
+
+def ocr_tesseract_scikit(state, image_path):
+    img = state['graph'].evaluate(image_path)['scikit_denoise_sobel']
+    return [(state['pool'].image_to_string(img), None)]
+
+
+def load_easyocr(tesseract_cmd=None):
+    from easyocr_engine import build_readers
+    return {'readers': build_readers()}
+
+
+def _readtext(state, image):
+    from easyocr_engine import readtext_shared
+    return [(res[1], res[2]) for res in readtext_shared(*state['readers'], image)]
+
+
+def ocr_easyocr(state, image_path):
+    return _readtext(state, image_path)
+
+
+def ocr_easyocr_pillow(state, image_path):
+    import numpy as np
+    with Image.open(image_path) as img:
+        sharpened_img = img.convert('RGB').filter(ImageFilter.SHARPEN)
+    return _readtext(state, np.array(sharpened_img))
+
+
+def load_easyocr_pytorch(tesseract_cmd=None):
+    from pyTorch import get_sharpening_engine
+    state = load_easyocr()
+    state['sharpening_engine'] = get_sharpening_engine()
+    return state
+
+
+def ocr_easyocr_pytorch(state, image_path):
+    import numpy as np
+    with Image.open(image_path) as img:
+        # A view of the engine's re-used buffer is enough: it is OCRed before the next image is sharpened
+        sharpened = state['sharpening_engine'].sharpen_batch([np.array(img.convert('RGB'))], copy=False)[0]
+    return _readtext(state, sharpened)
+
+
+def load_keras_ocr(tesseract_cmd=None):
+    import keras_ocr
+    return {'pipeline': keras_ocr.pipeline.Pipeline()}
+
+
+def ocr_keras_ocr(state, image_path):
+    return [(word, None) for word, box in state['pipeline'].recognize([image_path])[0]]
+
+
+ENGINES = {
+    'pytesseract': (load_pytesseract, ocr_pytesseract),  # miniProject.py
+    'tesseract_opencv': (load_tesseract_opencv, ocr_tesseract_opencv),
+    'tesseract_scikit': (load_tesseract_scikit, ocr_tesseract_scikit),
+    'easyocr': (load_easyocr, ocr_easyocr),
+    'easyocr_pillow': (load_easyocr, ocr_easyocr_pillow),
+    'easyocr_pytorch': (load_easyocr_pytorch, ocr_easyocr_pytorch),
+    'keras_ocr': (load_keras_ocr, ocr_keras_ocr),
+}
+
+
+# Function to read the peak resident set size in MB of this process plus its finished child processes
+# (the Tesseract workers), or None where unsupported (e.g. Windows)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Function to get the nearest-rank percentile of a list of values
+def percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+# Function to benchmark one engine over the corpus; runs inside its own worker process
+def benchmark_engine(engine, image_paths, warmup=1, tesseract_cmd=None):
+    load, ocr = ENGINES[engine]
+    result = {'engine': engine}
+    try:
+        start = time.perf_counter()
+        state = load(tesseract_cmd)
+        result['model_load_seconds'] = time.perf_counter() - start
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+
+    # Untimed warm-up images (first-call allocations, lazy initialization)
+    for image_path in image_paths[:warmup]:
+        try:
+            ocr(state, image_path)
+        except Exception:
+            pass
+
+    latencies = []
+    words = 0
+    confidences = []
+    errors = 0
+    for image_path in image_paths:
+        start = time.perf_counter()
+        try:
+            elements = ocr(state, image_path)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        words += sum(len(text.split()) for text, _ in elements)
+        confidences.extend(float(confidence) for _, confidence in elements if confidence is not None)
+
+    # Stop the Tesseract workers so their memory shows up in the peak RSS
+    if 'pool' in state:
+        state['pool'].close()
+
+    total_seconds = sum(latencies)
+    result.update({
+        'images': len(latencies),
+        'errors': errors,
+        'total_seconds': total_seconds,
+        'images_per_second': len(latencies) / total_seconds if total_seconds else None,
+        'latency_seconds': {
+            'mean': total_seconds / len(latencies) if latencies else None,
+            **{f'p{p}': percentile(latencies, p) for p in PERCENTILES},
+            'max': max(latencies) if latencies else None,
+        },
+        'peak_rss_mb': peak_rss_mb(),
+        'words': words,
+        'words_per_image': words / len(latencies) if latencies else None,
+        'mean_confidence': sum(confidences) / len(confidences) if confidences else None,
+    })
+    return result
+
+
+# Function to run every requested engine in a fresh process and collect the results
+def run_benchmark(image_directory, engines, limit=None, warmup=1, tesseract_cmd=None):
+    image_paths = sorted(os.path.join(image_directory, f) for f in os.listdir(image_directory)
+                         if f.lower().endswith(SUPPORTED_EXTENSIONS))[:limit]
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'corpus': os.path.abspath(image_directory),
+        'images': len(image_paths),
+        'warmup_images': warmup,
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'results': [],
+    }
+    for engine in engines:
+        print(f"Benchmarking {engine} on {len(image_paths)} images...")
+        # A fresh process per engine keeps model memory and peak RSS from bleeding between engines
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(benchmark_engine, engine, image_paths, warmup, tesseract_cmd).result()
+        report['results'].append(result)
+    return report
+
+
+# Function to print a one-line summary per engine
+def print_summary(report):
+    print(f"\n{'Engine':<18}{'Load s':>8}{'img/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+          f"{'RSS MB':>9}{'Words':>8}{'Conf':>7}{'Errors':>8}")
+
+    def fmt(value, width, digits=2):
+        return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+    for result in report['results']:
+        if 'error' in result:
+            print(f"{result['engine']:<18}failed: {result['error']}")
+            continue
+        latency = result['latency_seconds']
+        print(f"{result['engine']:<18}{fmt(result['model_load_seconds'], 8)}{fmt(result['images_per_second'], 8)}"
+              f"{fmt(latency['p50'], 8, 3)}{fmt(latency['p95'], 8, 3)}{fmt(latency['p99'], 8, 3)}"
+              f"{fmt(result['peak_rss_mb'], 9, 0)}{result['words']:>8}{fmt(result['mean_confidence'], 7)}"
+              f"{result['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OCR engines on an image directory.")
+    parser.add_argument('image_directory')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N images")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed warm-up images per engine")
+    parser.add_argument('--tesseract-cmd', default=None, help="Path to the tesseract executable")
+    parser.add_argument('--output', default='ocr_benchmark.json', help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.image_directory, args.engines, args.limit, args.warmup, args.tesseract_cmd)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
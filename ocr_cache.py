@@ -0,0 +1,171 @@
+"""
+Persistent, content-addressed cache of OCR results shared by the OCR scripts.
+
+Entries are keyed by a SHA-256 of the image bytes plus the OCR engine, language set and
+preprocessing variant, so re-running a folder only pays for images that have not been
+seen before (renamed or copied files still hit the cache).
+
+The cache is a single SQLite file. SQLite's locking makes it safe to share between
+processes (e.g. miniProject's worker pool), and the least recently used entries are
+evicted once the stored results grow past max_bytes. The total size is kept as a running
+count in a one-row table, updated in the same transaction as each write, so a put never
+has to add up the whole table. Reads don't write: hits are buffered and their access
+times written in one statement every ACCESS_FLUSH_EVERY hits / ACCESS_FLUSH_SECONDS
+(and on every put), so lookups don't take SQLite's write lock.
+"""
+import hashlib
+import json
+import multiprocessing.util
+import os
+import sqlite3
+import time
+
+# Default cache location: outside the evidence folders so read-only mounts still work
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.gru_ocr_cache.sqlite3')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB of stored results
+
+# Buffered access times are written once this many hits have built up, or this long after the last write
+ACCESS_FLUSH_EVERY = 256
+ACCESS_FLUSH_SECONDS = 5.0
+
+
+# Function to hash an image file's bytes without reading it into memory all at once
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to build a cache key from the image hash and the OCR settings
+def make_key(image_hash, engine, languages=(), variant='original'):
+    settings = f"{image_hash}|{engine}|{','.join(languages)}|{variant}"
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+
+# Convert NumPy values (boxes, confidences) to plain Python so they can be stored as JSON
+def _to_json(value):
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Cannot store {type(value).__name__} in the OCR cache")
+
+
+class OCRCache:
+    """SQLite-backed OCR result cache with a size limit and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, timeout=30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        self._touched = {}  # Key -> access time not yet written to the database
+        self._last_flush = time.monotonic()
+
+    # Connections can't be shared across processes, so each process opens its own
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS ocr_results ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'size INTEGER NOT NULL, last_access REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ocr_results_last_access ON ocr_results (last_access)')
+            # Running total of the stored sizes (seeded from the table the first time, e.g. for an older cache)
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_meta ('
+                         'id INTEGER PRIMARY KEY CHECK (id = 0), total_size INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO cache_meta (id, total_size) '
+                         'SELECT 0, COALESCE(SUM(size), 0) FROM ocr_results')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    # A cache sent to a worker process arrives as that process's own cache object, so every task the
+    # worker runs shares one connection and one buffer of access times
+    def __reduce__(self):
+        return _process_cache, (self.path, self.max_bytes, self.timeout)
+
+    def get(self, key):
+        """Return the stored result for key, or None if it is not cached."""
+        conn = self._connect()
+        row = conn.execute('SELECT value FROM ocr_results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= ACCESS_FLUSH_EVERY or time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS:
+            with conn:
+                self._flush_access(conn)
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store a JSON-serializable result and evict old entries if over the size limit."""
+        value = json.dumps(result, default=_to_json, ensure_ascii=False)
+        size = len(value.encode('utf-8'))
+        conn = self._connect()
+        with conn:
+            self._flush_access(conn)
+            # Keep the running total in step: take off the entry being replaced (if any), add the new one
+            conn.execute('UPDATE cache_meta SET total_size = total_size - '
+                         'COALESCE((SELECT size FROM ocr_results WHERE key = ?), 0)', (key,))
+            conn.execute('INSERT OR REPLACE INTO ocr_results (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                         (key, value, size, time.time()))
+            conn.execute('UPDATE cache_meta SET total_size = total_size + ?', (size,))
+            self._evict(conn)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, running compute() and storing its result on a miss."""
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    # Write the buffered access times of cache hits in one statement
+    def _flush_access(self, conn):
+        if self._touched:
+            conn.executemany('UPDATE ocr_results SET last_access = ? WHERE key = ?',
+                             [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched = {}
+        self._last_flush = time.monotonic()
+
+    # Delete least recently used entries until the cache fits in max_bytes
+    def _evict(self, conn):
+        total = conn.execute('SELECT total_size FROM cache_meta').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale_keys, freed = [], 0
+        for key, size in conn.execute('SELECT key, size FROM ocr_results ORDER BY last_access'):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM ocr_results WHERE key = ?', stale_keys)
+        conn.execute('UPDATE cache_meta SET total_size = total_size - ?', (freed,))
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            with self._conn:
+                self._flush_access(self._conn)
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+
+_process_caches = {}
+
+# Function to get this process's cache object for a path, creating it on first use
+def _process_cache(path, max_bytes, timeout):
+    key = (path, max_bytes, timeout)
+    if key not in _process_caches:
+        cache = _process_caches[key] = OCRCache(path, max_bytes, timeout)
+        # Close it (writing any buffered access times) when the process exits. Pool workers leave through
+        # os._exit, which skips atexit handlers but still runs multiprocessing's finalizers
+        multiprocessing.util.Finalize(None, cache.close, exitpriority=10)
+    return _process_caches[key]
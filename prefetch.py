@@ -0,0 +1,61 @@
+"""
+Background prefetching for the OCR loops.
+
+prefetch() runs a prepare function (read, decode, preprocess) over upcoming items on a few
+background threads while the caller is busy with the current one, typically waiting on OCR
+inference. Results come back in input order. At most `depth` items are prepared ahead, which
+caps the memory held by prefetched images. On slow or network-mounted image folders this hides
+most of the file I/O behind inference.
+
+PIL, OpenCV, NumPy and PyTorch release the GIL while decoding and filtering, so plain threads
+are enough to overlap the work.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Defaults used by the OCR scripts
+PREFETCH_DEPTH = 4
+PREFETCH_WORKERS = 2
+
+
+# Function to yield (item, prepare(item)) for each item in order, preparing up to depth items ahead
+# on background threads; if prepare raised, the exception is yielded in place of its result
+def prefetch(items, prepare, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS):
+    if depth <= 0:
+        # Prefetching turned off: prepare each item only when it is needed
+        for item in items:
+            try:
+                prepared = prepare(item)
+            except Exception as e:
+                prepared = e
+            yield item, prepared
+        return
+
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='prefetch')
+
+    # Function to queue the next item, returning False once the items run out
+    def submit_next():
+        for item in items:
+            pending.append((item, executor.submit(prepare, item)))
+            return True
+        return False
+
+    try:
+        while len(pending) < depth and submit_next():
+            pass
+        while pending:
+            item, future = pending.popleft()
+            # Keep the queue full while the caller works on this item
+            submit_next()
+            try:
+                prepared = future.result()
+            except Exception as e:
+                prepared = e
+            yield item, prepared
+    finally:
+        # Stop early (e.g. the caller broke out of the loop or hit an error): drop queued work
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,75 @@
+"""
+Preprocessing stage graph shared by the PyTesseract scripts.
+
+Each preprocessing variant is a stage that names the stages it is computed from. Stages are
+evaluated lazily and at most once per image, so variants that start from the same decoded or
+grayscale image share that work instead of each re-opening, copying and
+converting the image. With a resolution profile (see resolution.py) the decoded image is
+normalized before any other stage runs. Adding a variant only costs its own stages:
+
+    graph = build_default_graph()
+    graph.add_stage('adaptive_threshold', threshold_function, 'grayscale')
+    stages = graph.evaluate(image_path)
+    text = ocr(stages['adaptive_threshold'])
+"""
+import numpy as np
+from PIL import Image
+from resolution import normalize_resolution
+
+
+# Function to decode an image file once into an RGB NumPy array
+def decode_image(image_path):
+    with Image.open(image_path) as img:
+        return np.array(img.convert('RGB'))
+
+
+# Function to convert a decoded RGB array to an 8-bit grayscale array
+def to_grayscale(rgb):
+    return np.array(Image.fromarray(rgb).convert('L'))
+
+
+class PreprocessingGraph:
+    """Named preprocessing stages, each computed from the outputs of the stages it depends on."""
+
+    def __init__(self):
+        # Stage name -> (function, names of the stages whose outputs it takes);
+        # 'source' is the image path passed to evaluate()
+        self.stages = {}
+
+    def add_stage(self, name, function, *inputs):
+        """Register a stage computed as function(*outputs of inputs)."""
+        for stage in inputs:
+            if stage != 'source' and stage not in self.stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {stage!r}")
+        self.stages[name] = (function, inputs)
+
+    def evaluate(self, image_path):
+        """Return the lazily computed stage outputs for one image."""
+        return StageResults(self, image_path)
+
+
+class StageResults:
+    """Stage outputs for one image; a stage runs the first time it (or a stage after it) is needed."""
+
+    def __init__(self, graph, image_path):
+        self.graph = graph
+        self.values = {'source': image_path}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            function, inputs = self.graph.stages[name]
+            self.values[name] = function(*(self[stage] for stage in inputs))
+        return self.values[name]
+
+
+# Function to build a graph with the stages every variant shares: decode, (resize,) and grayscale
+def build_default_graph(resolution_profile=None):
+    graph = PreprocessingGraph()
+    graph.add_stage('decoded', decode_image, 'source')
+    if resolution_profile is None:
+        graph.add_stage('grayscale', to_grayscale, 'decoded')
+    else:
+        # Normalize the resolution right after decoding so every later stage works on the resized image
+        graph.add_stage('resized', lambda rgb: normalize_resolution(rgb, resolution_profile)[0], 'decoded')
+        graph.add_stage('grayscale', to_grayscale, 'resized')
+    return graph
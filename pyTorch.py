@@ -8,188 +8,178 @@ not as useful as other pre-processing techniques)
 import warnings
 warnings.filterwarnings('ignore')
 
-import os
+import threading
 import time
+from collections import OrderedDict
 import torch
-import torchvision.transforms as transforms
-import easyocr
+import numpy as np
 from PIL import Image
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as ExcelImage
-from tqdm import tqdm  # Import tqdm for progress bar
-import re
-
-# Preprocessing function to clean and split text into words
-def preprocess_words(text):
-    text = re.sub(r'[^\w\s]', '', text).lower()
-    words = text.split()
-    return words
-
-# Function to perform OCR on an image using two readers
-def perform_ocr(reader_simplified, reader_traditional, file_path):
-    results = reader_simplified.readtext(file_path, detail=1)
-
-    # Fallback to Traditional Chinese reader if no text is found
-    if not results:
-        results = reader_traditional.readtext(file_path, detail=1)
-
-    if results:
-        extracted_text = ' '.join([res[1] for res in results])
-        confidences = [res[2] for res in results]
-        avg_confidence = sum(confidences) / len(confidences)
-        return extracted_text, avg_confidence, confidences
-    else:
-        return "No text found", 0, []
+from sharpen_comparison import run_comparison
+
+# Number of images per EasyOCR forward pass; 1 keeps the original one-image-at-a-time loop
+BATCH_SIZE = 1
+
+# Only sharpen and re-OCR an image when its original pass found no text or its average confidence
+# is below SECOND_PASS_MIN_CONFIDENCE (False always runs both passes)
+GATED_SECOND_PASS = False
+SECOND_PASS_MIN_CONFIDENCE = 0.6
+
+# Resolution profile applied before sharpening and OCR (see resolution.py): 'easyocr' scales huge photos
+# down and tiny crops up; None OCRs images at their own size
+RESOLUTION_PROFILE = None
+
+# Images read, decoded and sharpened in the background ahead of the one being OCRed (bounds the memory
+# they hold; 0 reads each image only when it is needed)
+PREFETCH_DEPTH = 4
+
+# Stream rows to write-only workbooks as images are processed (recommended for very large folders)
+STREAMING_EXPORT = False
+
+# How images go into the Excel sheet: 'thumbnail' (small in-memory JPEGs at the displayed size),
+# 'embed' (the full-resolution files) or 'link' (hyperlinks to the original files)
+EXCEL_IMAGE_MODE = 'thumbnail'
+
+# Number of CPU threads PyTorch may use for sharpening (None keeps PyTorch's default)
+SHARPEN_THREADS = None
+
+# Most same-size images sharpened by one conv2d call, and how many batch shapes each thread keeps
+# buffers for (bounds the memory the buffers hold)
+SHARPEN_BATCH_SIZE = 4
+SHARPEN_CACHED_SHAPES = 4
+
+# PyTorch-based sharpening engine that keeps its kernel, thread settings and buffers across calls
+class SharpeningEngine:
+    def __init__(self, num_threads=None, max_batch=SHARPEN_BATCH_SIZE, cached_shapes=SHARPEN_CACHED_SHAPES):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.max_batch = max_batch
+        self.cached_shapes = cached_shapes
+
+        # Define sharpening kernel (built once, expanded per channel count on demand)
+        self.sharpening_kernel = torch.tensor([[
+            [-1, -1, -1],
+            [-1, 9, -1],
+            [-1, -1, -1]
+        ]], dtype=torch.float32)
+        self._kernels = {}
+
+        # Re-usable float input / uint8 output buffers, keyed by batch shape; each thread (e.g. each
+        # prefetch thread) has its own, so threads sharpen side by side instead of taking turns
+        self._local = threading.local()
+
+        # Throughput stats
+        self._stats_lock = threading.Lock()
+        self.images_processed = 0
+        self.seconds_spent = 0.0
+
+    @property
+    def images_per_second(self):
+        return self.images_processed / self.seconds_spent if self.seconds_spent else 0.0
+
+    def _kernel_for(self, channels):
+        if channels not in self._kernels:
+            # Expand kernel dimensions to match image channels
+            self._kernels[channels] = self.sharpening_kernel.expand(channels, 1, 3, 3).contiguous()
+        return self._kernels[channels]
+
+    def _buffers_for(self, shape, with_output):
+        # Per shape: an N x C x H x W float input buffer (the layout ToTensor produced) and, only once a
+        # caller asks for views, an N x H x W x C uint8 output buffer
+        if not hasattr(self._local, 'buffers'):
+            self._local.buffers = OrderedDict()
+        buffers = self._local.buffers
+        if shape in buffers:
+            buffers.move_to_end(shape)
+        else:
+            # Drop the least recently used shape once the cache is full
+            if len(buffers) >= self.cached_shapes:
+                buffers.popitem(last=False)
+            count, height, width, channels = shape
+            buffers[shape] = [torch.empty((count, channels, height, width), dtype=torch.float32), None]
+        if with_output and buffers[shape][1] is None:
+            buffers[shape][1] = torch.empty(shape, dtype=torch.uint8)
+        return buffers[shape]
+
+    def sharpen_batch(self, arrays, copy=True):
+        """Sharpen a list of same-size uint8 HxWxC arrays with one conv2d call, returning uint8 arrays.
+
+        The pixels match the old ToTensor / ToPILImage version: scaled to [0, 1], clamped, then
+        multiplied by 255 and truncated. With copy=False the results are views of a re-used buffer,
+        only valid until this thread's next call.
+        """
+        start = time.perf_counter()
+        height, width, channels = arrays[0].shape
+        shape = (len(arrays), height, width, channels)
+        input_buffer, output_buffer = self._buffers_for(shape, with_output=not copy)
+
+        # Convert to float in [0, 1] in place of ToTensor
+        for i, array in enumerate(arrays):
+            input_buffer[i].copy_(torch.from_numpy(array).permute(2, 0, 1))
+        input_buffer.div_(255)
+
+        # Apply sharpening using convolution
+        sharpened = torch.nn.functional.conv2d(input_buffer, self._kernel_for(channels), padding=1, groups=channels)
+
+        # Clip the values to the range [0, 1] and convert back to uint8 as ToPILImage did (mul(255), truncate),
+        # straight into the arrays handed back (one new array for the whole batch, or the re-used output
+        # buffer for views)
+        sharpened.clamp_(0, 1).mul_(255)
+        output = np.empty(shape, dtype=np.uint8) if copy else output_buffer.numpy()
+        torch.from_numpy(output).copy_(sharpened.permute(0, 2, 3, 1))
+
+        with self._stats_lock:
+            self.images_processed += len(arrays)
+            self.seconds_spent += time.perf_counter() - start
+        return list(output)
+
+    def sharpen_many(self, arrays):
+        """Sharpen uint8 HxWxC arrays of any sizes, one conv2d call per group of up to max_batch same-size ones."""
+        groups = {}
+        for index, array in enumerate(arrays):
+            groups.setdefault(array.shape, []).append(index)
+        sharpened = [None] * len(arrays)
+        for indices in groups.values():
+            for begin in range(0, len(indices), self.max_batch):
+                batch = indices[begin:begin + self.max_batch]
+                for index, result in zip(batch, self.sharpen_batch([arrays[i] for i in batch])):
+                    sharpened[index] = result
+        return sharpened
+
+    def sharpen(self, image):
+        """Sharpen a single PIL image, returning a PIL image."""
+        array = np.array(image)
+        if array.ndim == 2:
+            array = array[:, :, None]
+        # Image.fromarray copies RGB pixels, so a view of the re-used buffer is enough; it would share a
+        # single-channel buffer, so that one is copied out
+        sharpened = self.sharpen_batch([array], copy=False)[0]
+        if sharpened.shape[2] == 1:
+            return Image.fromarray(sharpened.squeeze(2).copy())
+        return Image.fromarray(sharpened)
+
+_sharpening_engine = None
+
+# Function to get the shared sharpening engine, creating it on first use
+def get_sharpening_engine():
+    global _sharpening_engine
+    if _sharpening_engine is None:
+        _sharpening_engine = SharpeningEngine(SHARPEN_THREADS)
+    return _sharpening_engine
 
 # PyTorch-based function to sharpen an image
 def sharpen_image_pytorch(image):
-    # Convert PIL image to tensor
-    transform = transforms.ToTensor()
-    image_tensor = transform(image).unsqueeze(0)  # Add batch dimension
-
-    # Define sharpening kernel
-    sharpening_kernel = torch.tensor([[
-        [-1, -1, -1],
-        [-1, 9, -1],
-        [-1, -1, -1]
-    ]], dtype=torch.float32)
-
-    # Expand kernel dimensions to match image channels
-    kernel = sharpening_kernel.expand(image_tensor.size(1), 1, 3, 3)
-
-    # Apply sharpening using convolution
-    sharpened_tensor = torch.nn.functional.conv2d(image_tensor, kernel, padding=1, groups=image_tensor.size(1))
-
-    # Clip the values to the range [0, 1]
-    sharpened_tensor = torch.clamp(sharpened_tensor, 0, 1)
-
-    # Convert back to PIL image
-    transform_to_pil = transforms.ToPILImage()
-    return transform_to_pil(sharpened_tensor.squeeze(0))  # Remove batch dimension
-
-# Function to process images and extract text with word count
-def extract_text_from_images(directory):
-    reader_simplified = easyocr.Reader(['en', 'ch_sim'], verbose=False)
-    reader_traditional = easyocr.Reader(['en', 'ch_tra'], verbose=False)
-
-    data = []
-    supported_extensions = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
-    sharpened_image_paths = []  # Track created sharpened image paths
-
-    for filename in tqdm(os.listdir(directory), desc="Processing Images", unit="image"):
-        if filename.lower().endswith(supported_extensions):
-            file_path = os.path.join(directory, filename)
-
-            # Extract text from original image
-            original_text, avg_confidence, _ = perform_ocr(reader_simplified, reader_traditional, file_path)
-            original_word_count = len(preprocess_words(original_text))
-
-            # Apply sharpening filter using PyTorch
-            try:
-                img = Image.open(file_path)
-                sharpened_img = sharpen_image_pytorch(img)
-
-                # Save the sharpened image temporarily
-                sharpened_image_path = os.path.join(directory, f"sharpened_{filename}")
-                sharpened_img.save(sharpened_image_path)
-                sharpened_image_paths.append(sharpened_image_path)  # Keep track of the path
-
-                # Extract text from the sharpened image
-                sharpened_text, _, _ = perform_ocr(reader_simplified, reader_traditional, sharpened_image_path)
-                sharpened_word_count = len(preprocess_words(sharpened_text))
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                sharpened_image_path = None
-                sharpened_text = "Error during sharpening"
-                sharpened_word_count = 0
-
-            # Append to data
-            data.append([
-                file_path, original_text, original_word_count, sharpened_image_path,
-                sharpened_text, sharpened_word_count
-            ])
-
-    return data, sharpened_image_paths
-
-# Function to save images and text to Excel
-def save_to_excel(directory, data, excel_filename):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "OCR Results"
-
-    ws.column_dimensions['A'].width = 30
-    ws.column_dimensions['B'].width = 50
-    ws.column_dimensions['C'].width = 20
-    ws.column_dimensions['D'].width = 30
-    ws.column_dimensions['E'].width = 50
-    ws.column_dimensions['F'].width = 20
-
-    ws.append([
-        "Original Image", "Text from Original Image", "Original Image Word Count",
-        "Sharpened Image", "Text from Sharpened Image", "Sharpened Image Word Count"
-    ])
-
-    for i, (original_image_path, original_text, original_word_count,
-            sharpened_image_path, sharpened_text, sharpened_word_count) in enumerate(data, start=2):
-
-        try:
-            orig_img = ExcelImage(original_image_path)
-            orig_img.width, orig_img.height = 150, 100
-            ws.add_image(orig_img, f'A{i}')
-        except Exception as e:
-            print(f"Error adding original image to Excel: {e}")
-
-        ws[f'B{i}'] = original_text
-        ws[f'C{i}'] = original_word_count
-
-        if sharpened_image_path:
-            try:
-                sharp_img = ExcelImage(sharpened_image_path)
-                sharp_img.width, sharp_img.height = 150, 100
-                ws.add_image(sharp_img, f'D{i}')
-            except Exception as e:
-                print(f"Error adding sharpened image to Excel: {e}")
-
-        ws[f'E{i}'] = sharpened_text
-        ws[f'F{i}'] = sharpened_word_count
-
-        row_height = 100 * 0.75
-        ws.row_dimensions[i].height = row_height
-
-    excel_path = os.path.join(directory, excel_filename)
-    wb.save(excel_path)
-    print(f"Data has been successfully exported to {excel_path}")
-
-# Main function to handle user input and export to Excel
+    return get_sharpening_engine().sharpen(image)
+
+# Function to sharpen a list of RGB arrays with the shared PyTorch engine (same-size ones share conv2d calls)
+def sharpen_arrays(arrays):
+    return get_sharpening_engine().sharpen_many(arrays)
+
+# Main function to handle user input and export to Excel (see sharpen_comparison.py)
 def main():
-    start_time = time.time()
-    directory = input("Enter the directory of your images: ").strip()
-    if not os.path.isdir(directory):
-        print("Invalid directory. Please try again.")
-        return
-
-    excel_filename = input("Enter the name of your Excel file (without extension): ").strip()
-    if not excel_filename:
-        excel_filename = "OCR_Results.xlsx"
-    else:
-        excel_filename += ".xlsx"
-
-    # Extract text from images
-    data, sharpened_image_paths = extract_text_from_images(directory)
-
-    # Save data to Excel
-    save_to_excel(directory, data, excel_filename)
-
-    # Clean up: Delete the temporary sharpened images
-    for path in sharpened_image_paths:
-        try:
-            os.remove(path)
-            #print(f"Deleted temporary file: {path}")
-        except Exception as e:
-            print(f"Error deleting file {path}: {e}")
-
-    end_time = time.time()
-    print(f"Time taken: {end_time - start_time:.2f} seconds")
+    run_comparison(sharpen_arrays, BATCH_SIZE, gated=GATED_SECOND_PASS, min_confidence=SECOND_PASS_MIN_CONFIDENCE,
+                   profile=RESOLUTION_PROFILE, prefetch_depth=PREFETCH_DEPTH, streaming=STREAMING_EXPORT,
+                   image_mode=EXCEL_IMAGE_MODE)
+    print(f"Sharpening throughput: {get_sharpening_engine().images_per_second:.1f} images/sec")
 
 if __name__ == "__main__":
     main()
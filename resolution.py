@@ -0,0 +1,73 @@
+"""
+Resolution normalization applied to images before OCR.
+
+Huge photos are scaled down until they fit the engine's pixel budget, which bounds per-image
+latency. Tiny images, typically tight crops of a label whose short side is roughly one line of
+text, are scaled up so the glyphs reach a height the engine recognizes reliably. Each engine
+gets its own profile.
+
+normalize_resolution returns the scale it applied, so boxes detected on the normalized image
+can be mapped back to original image coordinates with map_box_to_original.
+"""
+import math
+import numpy as np
+from PIL import Image
+
+# Per-engine limits:
+#   max_pixels     - images with more pixels are scaled down to this many
+#   min_short_side - images whose short side is smaller are scaled up to it (about one line of text)
+#   max_upscale    - never enlarge by more than this factor
+RESOLUTION_PROFILES = {
+    # EasyOCR's detector works on at most a 2560px canvas and its recognizer resizes every text box
+    # to 64px high, so pixels beyond ~4 MP only cost decode, grayscale and crop time
+    'easyocr': {'max_pixels': 4_000_000, 'min_short_side': 96, 'max_upscale': 4.0},
+    # Tesseract reads best with capital letters around 30px high and copes well with large pages
+    'tesseract': {'max_pixels': 8_000_000, 'min_short_side': 64, 'max_upscale': 4.0},
+    # keras-ocr's pipeline already doubles images and then caps them at 2048px on the long side
+    'keras_ocr': {'max_pixels': 2_000_000, 'min_short_side': 48, 'max_upscale': 2.0},
+}
+
+
+# Function to pick the scale factor that brings a width x height image within a profile's limits
+def resolution_scale(width, height, profile):
+    limits = RESOLUTION_PROFILES[profile] if isinstance(profile, str) else profile
+    pixels = width * height
+    if pixels > limits['max_pixels']:
+        return math.sqrt(limits['max_pixels'] / pixels)
+
+    short_side = min(width, height)
+    if 0 < short_side < limits['min_short_side']:
+        scale = min(limits['min_short_side'] / short_side, limits['max_upscale'])
+        # Don't let a long, thin image grow past the pixel budget
+        return min(scale, math.sqrt(limits['max_pixels'] / pixels))
+    return 1.0
+
+
+# Function to resize a PIL image or NumPy array for an engine profile, returning (image, scale)
+def normalize_resolution(image, profile):
+    is_array = isinstance(image, np.ndarray)
+    pil_image = Image.fromarray(image) if is_array else image
+    width, height = pil_image.size
+
+    scale = resolution_scale(width, height, profile)
+    if scale == 1.0:
+        return image, 1.0
+
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # LANCZOS keeps text edges crisp when shrinking; BICUBIC avoids ringing when enlarging
+    resized = pil_image.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+    return (np.array(resized) if is_array else resized), scale
+
+
+# Function to map a box (a list/array of [x, y] points) from the normalized image back to the original
+def map_box_to_original(box, scale):
+    if scale == 1.0:
+        return box
+    if isinstance(box, np.ndarray):
+        return box / scale
+    return [[int(round(x / scale)), int(round(y / scale))] for x, y in box]
+
+
+# Function to name an OCR cache variant, so results from normalized images are cached separately
+def resolution_variant(variant, profile):
+    return variant if profile is None else f'{variant}@{profile}'
@@ -0,0 +1,100 @@
+"""
+On-disk manifest of the images a run has already finished, so interrupted runs can resume.
+
+Every completed image is appended to a JSON Lines file as soon as it is done, together with
+its size, modification time and the OCR settings used, and flushed to disk. Re-running over
+the same folder loads those checkpoints instead of OCRing the images again; an image is only
+redone if its file changed or the settings differ. A crash or Ctrl-C loses at most the image
+that was being processed.
+"""
+import json
+import os
+
+# Default manifest file name, created in the image directory
+MANIFEST_FILENAME = '.ocr_run_manifest.jsonl'
+
+
+# Convert NumPy values (e.g. confidences) to plain Python so they can be stored as JSON
+def _to_json(value):
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Cannot store {type(value).__name__} in the run manifest")
+
+
+# Function to normalize settings the way a JSON round-trip would (tuples become lists)
+def _normalize(value):
+    return json.loads(json.dumps(value))
+
+
+class RunManifest:
+    """Append-only checkpoint log of per-image results, keyed by path relative to the manifest."""
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = _normalize(settings)
+        self.entries = {}  # Relative image path -> last checkpoint written for it
+        self._file = None
+        self._load()
+
+    # Read existing checkpoints; later lines win, and a torn last line from a crash is skipped
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry['path']] = entry
+
+    def _key(self, image_path):
+        return os.path.relpath(image_path, os.path.dirname(os.path.abspath(self.path)))
+
+    # Size and modification time identify the version of the file that was processed
+    def _fingerprint(self, image_path):
+        stat = os.stat(image_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def lookup(self, image_path):
+        """Return the checkpointed result for image_path, or None if it has to be (re)processed."""
+        entry = self.entries.get(self._key(image_path))
+        if entry is None or entry['settings'] != self.settings:
+            return None
+        if (entry['size'], entry['mtime_ns']) != self._fingerprint(image_path):
+            return None
+        return entry['result']
+
+    def record(self, image_path, result):
+        """Checkpoint a finished image's JSON-serializable result, flushing it to disk."""
+        size, mtime_ns = self._fingerprint(image_path)
+        entry = {'path': self._key(image_path), 'size': size, 'mtime_ns': mtime_ns,
+                 'settings': self.settings, 'result': result}
+        line = json.dumps(entry, default=_to_json, ensure_ascii=False)
+
+        if self._file is None:
+            # Finish a line torn by an earlier crash so the new checkpoint starts on its own line
+            torn = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                self._file.write('\n')
+
+        self._file.write(line + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.entries[entry['path']] = json.loads(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
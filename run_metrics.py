@@ -0,0 +1,167 @@
+"""
+Streaming run metrics for the OCR scripts.
+
+RunMetrics accumulates counters (images, extracted elements, spell errors, bytes read, ...)
+and histograms (per-element confidence, per-stage latency) as results come in, instead of
+loose totals that are only added up at the end. While a run is going it periodically writes
+a snapshot next to the results, so long jobs can be watched live:
+
+    <base>.json           latest snapshot: counters, per-second rates and histograms
+    <base>.prom           the same in Prometheus text format (e.g. for node_exporter's
+                          textfile collector)
+    <base>_history.jsonl  one snapshot per export, for graphing throughput over time (kept
+                          across runs; each snapshot carries its run's run_id)
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Seconds between snapshots written during a run
+DEFAULT_EXPORT_INTERVAL = 30.0
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running count and sum, like a Prometheus histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        total, counts = 0, []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def to_dict(self):
+        return {'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.cumulative_counts())),
+                'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else None}
+
+
+# Function to turn a labels dict into a hashable, ordered key
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+# Function to format labels the way Prometheus expects, e.g. {stage="detect",le="0.5"}
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class RunMetrics:
+    """Counters and histograms for one run, exported as JSON and Prometheus text snapshots."""
+
+    def __init__(self, export_base=None, interval=DEFAULT_EXPORT_INTERVAL, prefix='ocr', histogram_buckets=None):
+        self.export_base = export_base
+        self.interval = interval
+        self.prefix = prefix
+        # Histogram name -> bucket upper bounds; anything else uses LATENCY_BUCKETS
+        self.histogram_buckets = histogram_buckets or {}
+        self.counters = {}    # (name, label key) -> value
+        self.histograms = {}  # (name, label key) -> Histogram
+        self.started = time.time()
+        # Identifies this run's lines in the history file, which earlier runs also appended to
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(self.started))}-{os.getpid()}"
+        self._last_export = time.monotonic()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def value(self, name, **labels):
+        """Return a counter's current value (0 if it was never incremented)."""
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    def observe(self, name, value, **labels):
+        """Record one value in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.histogram_buckets.get(name, LATENCY_BUCKETS))
+            self.histograms[key].observe(value)
+
+    def histogram(self, name, **labels):
+        """Return a histogram, or None if nothing was recorded in it."""
+        return self.histograms.get((name, _label_key(labels)))
+
+    def snapshot(self):
+        """Return the current counters, per-second rates and histograms as a JSON-serializable dict."""
+        with self._lock:
+            elapsed = time.time() - self.started
+            counters = {name + _format_labels(labels): value for (name, labels), value in sorted(self.counters.items())}
+            histograms = {name + _format_labels(labels): histogram.to_dict()
+                          for (name, labels), histogram in sorted(self.histograms.items())}
+        return {
+            'run_id': self.run_id,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'elapsed_seconds': elapsed,
+            'counters': counters,
+            'rates_per_second': {name: value / elapsed if elapsed > 0 else 0.0 for name, value in counters.items()},
+            'histograms': histograms,
+        }
+
+    def to_prometheus(self):
+        """Return the current metrics in the Prometheus text exposition format."""
+        lines = [f'# TYPE {self.prefix}_run_elapsed_seconds gauge',
+                 f'{self.prefix}_run_elapsed_seconds {time.time() - self.started:.3f}']
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f'{self.prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{_format_labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                bounds = [str(b) for b in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{metric}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def maybe_export(self):
+        """Write a snapshot if the export interval has passed since the last one."""
+        if self.export_base and self.interval and time.monotonic() - self._last_export >= self.interval:
+            self.export()
+
+    def export(self):
+        """Write the JSON and Prometheus snapshots and append to the history file."""
+        if not self.export_base:
+            return
+        self._last_export = time.monotonic()
+        snapshot = self.snapshot()
+        _write_atomic(self.export_base + '.json', json.dumps(snapshot, indent=2))
+        _write_atomic(self.export_base + '.prom', self.to_prometheus())
+        with open(self.export_base + '_history.jsonl', 'a', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot) + '\n')
+
+
+# Function to replace a file in one step, so a dashboard never reads a half-written snapshot
+def _write_atomic(path, text):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,365 @@
+"""
+Original vs sharpened image OCR comparison shared by Pillow_preprocessing.py and pyTorch.py.
+
+Each image is OCRed as it is and again after sharpening, and the text and word counts of both
+passes are written to an Excel sheet next to the two images. The scripts only differ in how
+they sharpen, so they pass their sharpener in as sharpen_arrays: a function taking a list of
+RGB uint8 arrays and returning their sharpened versions in the same order.
+
+Images are read, decoded and (unless gated) sharpened on background prefetch threads while
+EasyOCR works on the current ones. With batch_size > 1 the directory is OCRed a window at a
+time, so similar-size images share detector forward passes; with gated=True the sharpened
+pass only runs for images whose original pass found no text or had low confidence.
+"""
+import os
+import re
+import time
+from functools import partial
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from tqdm import tqdm  # Import tqdm for progress bar
+from easyocr_engine import (SECOND_PASS_SKIPPED, build_readers, needs_second_pass, prepare_input,
+                            readtext_shared, readtext_shared_batched)
+from excel_export import ExcelResultsWriter
+from prefetch import PREFETCH_WORKERS, prefetch
+from resolution import normalize_resolution
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+
+# Default average confidence below which the gated second pass runs
+SECOND_PASS_MIN_CONFIDENCE = 0.6
+
+# Default number of images read and preprocessed ahead of the one being OCRed
+PREFETCH_DEPTH = 4
+
+# Preprocessing function to clean and split text into words
+def preprocess_words(text):
+    # Remove punctuation using regex and convert to lowercase
+    text = re.sub(r'[^\w\s]', '', text).lower()
+    # Split text into a list of words
+    words = text.split()
+    return words
+
+# Function to perform OCR on an image using two readers
+def perform_ocr(reader_simplified, reader_traditional, image, profile=None):
+    # image can be a file path or a NumPy array; detection runs once and the
+    # Traditional Chinese fallback re-uses the same text boxes
+    results = readtext_shared(reader_simplified, reader_traditional, image, profile)
+    return summarize_results(results)
+
+# Function to read text from a list of images (file paths or NumPy arrays) in size-grouped batches
+def perform_ocr_batched(reader_simplified, reader_traditional, images, batch_size):
+    results = readtext_shared_batched(reader_simplified, reader_traditional, images, batch_size)
+    return [summarize_results(image_results) for image_results in results]
+
+# Function to turn EasyOCR results into (text, average confidence, confidences)
+def summarize_results(results):
+    if results:
+        extracted_text = ' '.join([res[1] for res in results])
+        confidences = [res[2] for res in results]
+        avg_confidence = sum(confidences) / len(confidences)
+        return extracted_text, avg_confidence, confidences
+    else:
+        return "No text found", 0, []
+
+# Function to keep a sharpened image in memory as PNG bytes for the Excel sheet
+def encode_png(sharpened):
+    sharpened_image = BytesIO()
+    Image.fromarray(sharpened).save(sharpened_image, format='PNG')
+    return sharpened_image
+
+# Function to sharpen an RGB array, returning the sharpened array and PNG bytes for the Excel sheet
+def sharpen_image(sharpen_arrays, rgb):
+    sharpened = sharpen_arrays([rgb])[0]
+    return sharpened, encode_png(sharpened)
+
+# Function to read and decode an image ahead of OCR, and sharpen it too when sharpen=True; runs on the
+# prefetch threads. ocr_input is the (image, grayscale) pair EasyOCR itself would make from the file, so
+# the original pass reads the same pixels whatever the batch size
+def prepare_image(file_path, sharpen_arrays, sharpen=True, profile=None):
+    with Image.open(file_path) as img:
+        original = np.array(img.convert('RGB'))
+    # Normalize the resolution once, so sharpening also works on the normalized image
+    if profile is not None:
+        original, _ = normalize_resolution(original, profile)
+    prepared = {'original': original, 'ocr_input': prepare_input(file_path if profile is None else original)}
+    if sharpen:
+        # A failed sharpen only loses the second pass, so keep the error for when it is needed
+        try:
+            prepared['sharpened'], prepared['sharpened_image'] = sharpen_image(sharpen_arrays, original)
+        except Exception as e:
+            prepared['sharpen_error'] = e
+    return prepared
+
+# Function to get a prepared image's sharpened version, sharpening it now if it was not prefetched
+def sharpened_version(prepared, sharpen_arrays):
+    if 'sharpen_error' in prepared:
+        raise prepared['sharpen_error']
+    if 'sharpened' not in prepared:
+        prepared['sharpened'], prepared['sharpened_image'] = sharpen_image(sharpen_arrays, prepared['original'])
+    return prepared['sharpened'], prepared['sharpened_image']
+
+# Function to sharpen several prepared images with one sharpen_arrays call (so a batching sharpener can
+# process same-size ones together); if that call fails they are left for sharpened_version to redo one
+# at a time, so only the images that really fail lose their second pass
+def sharpen_prepared(prepared, sharpen_arrays):
+    pending = [image for image in prepared if 'sharpened' not in image and 'sharpen_error' not in image]
+    if not pending:
+        return
+    try:
+        results = sharpen_arrays([image['original'] for image in pending])
+    except Exception:
+        return
+    for image, sharpened in zip(pending, results):
+        image['sharpened'], image['sharpened_image'] = sharpened, encode_png(sharpened)
+
+# Function to OCR a window of prepared images (prepare_image results, or the exception that stopped
+# one from being read) in batches; with gated=True the sharpened versions are only made and OCRed
+# for images whose original pass needs it, otherwise both share batches
+def process_batch(reader_simplified, reader_traditional, file_paths, prepared, batch_size, sharpen_arrays,
+                  gated=False, min_confidence=SECOND_PASS_MIN_CONFIDENCE):
+    originals, sharpened, sharpened_images = [], {}, {}
+
+    for file_path, image in zip(file_paths, prepared):
+        if isinstance(image, Exception):
+            print(f"Error processing {os.path.basename(file_path)}: {image}")
+            originals.append(None)
+        else:
+            originals.append(image['ocr_input'])
+    valid = [i for i, image in enumerate(originals) if image is not None]
+
+    # Function to sharpen the given images (unless already prefetched) together, recording the ones that fail
+    def sharpen_all(indices):
+        sharpen_prepared([prepared[i] for i in indices], sharpen_arrays)
+        for i in indices:
+            try:
+                sharpened[i], sharpened_images[i] = sharpened_version(prepared[i], sharpen_arrays)
+            except Exception as e:
+                print(f"Error processing {os.path.basename(file_paths[i])}: {e}")
+        return [i for i in indices if i in sharpened]
+
+    if gated:
+        # First pass on the originals only, then sharpen and OCR just the uncertain ones
+        ocr_results = perform_ocr_batched(reader_simplified, reader_traditional,
+                                          [originals[i] for i in valid], batch_size)
+        original_results = dict(zip(valid, ocr_results))
+        second_pass = [i for i in valid if needs_second_pass(original_results[i][2], min_confidence)]
+        sharpened_valid = sharpen_all(second_pass)
+        ocr_results = perform_ocr_batched(reader_simplified, reader_traditional,
+                                          [sharpened[i] for i in sharpened_valid], batch_size)
+        sharpened_results = dict(zip(sharpened_valid, ocr_results))
+    else:
+        # Originals and their sharpened versions have the same size, so they share batches
+        second_pass = valid
+        sharpened_valid = sharpen_all(valid)
+        ocr_results = perform_ocr_batched(reader_simplified, reader_traditional,
+                                          [originals[i] for i in valid] + [sharpened[i] for i in sharpened_valid],
+                                          batch_size)
+        original_results = dict(zip(valid, ocr_results[:len(valid)]))
+        sharpened_results = dict(zip(sharpened_valid, ocr_results[len(valid):]))
+
+    data = []
+    for i, file_path in enumerate(file_paths):
+        if i in original_results:
+            original_text = original_results[i][0]
+            original_word_count = len(preprocess_words(original_text))
+            if i in sharpened_results:
+                sharpened_text = sharpened_results[i][0]
+                sharpened_word_count = len(preprocess_words(sharpened_text))
+            elif i not in second_pass:
+                sharpened_text, sharpened_word_count = SECOND_PASS_SKIPPED, None
+            else:
+                sharpened_text, sharpened_word_count = "Error during sharpening", 0
+        else:
+            original_text, original_word_count = "Error during OCR", 0
+            sharpened_text, sharpened_word_count = "Error during sharpening", 0
+        data.append([
+            file_path, original_text, original_word_count, sharpened_images.get(i),
+            sharpened_text, sharpened_word_count
+        ])
+    return data
+
+# Function to process images and extract text with word count
+# (with gated=True the sharpened pass only runs when the original pass is empty or below min_confidence;
+# prefetch_depth images are read and preprocessed ahead in the background, 0 turns that off)
+def extract_text_from_images(directory, sharpen_arrays, batch_size=1, on_result=None, gated=False, profile=None,
+                             prefetch_depth=PREFETCH_DEPTH, min_confidence=SECOND_PASS_MIN_CONFIDENCE):
+    # Initialize the OCR readers
+    reader_simplified, reader_traditional = build_readers()
+
+    # Initialize list to store data for the Excel file
+    data = []
+    total_images = 0
+    second_passes_skipped = 0
+
+    # Function to hand each finished row on, counting the skipped second passes
+    def emit(row):
+        nonlocal total_images, second_passes_skipped
+        total_images += 1
+        if row[4] == SECOND_PASS_SKIPPED:
+            second_passes_skipped += 1
+        # Append to data (or hand the row straight to on_result, e.g. to stream it to Excel)
+        if on_result is not None:
+            on_result(row)
+        else:
+            data.append(row)
+
+    file_paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(SUPPORTED_EXTENSIONS)]
+
+    # Background threads read, decode and (unless gated or batched) sharpen upcoming images while EasyOCR
+    # works on the current ones; in gated mode the sharpening waits until the original pass asks for it,
+    # and in batched mode each window is sharpened in one call
+    prepare = partial(prepare_image, sharpen_arrays=sharpen_arrays, sharpen=not gated and batch_size <= 1,
+                      profile=profile)
+
+    # Batched mode: OCR the directory a window at a time so similar-size images share forward passes
+    if batch_size > 1:
+        window_size = batch_size * 4  # Look ahead a few batches to find images of similar size
+        # Prefetch a whole window ahead, so the next window is ready when this one finishes
+        depth = max(prefetch_depth, window_size) if prefetch_depth > 0 else 0
+        window_paths, window_prepared = [], []
+        with tqdm(total=len(file_paths), desc="Processing Images", unit="image") as progress:
+            for index, (file_path, prepared) in enumerate(prefetch(file_paths, prepare, depth, PREFETCH_WORKERS)):
+                window_paths.append(file_path)
+                window_prepared.append(prepared)
+                if len(window_paths) == window_size or index == len(file_paths) - 1:
+                    for row in process_batch(reader_simplified, reader_traditional, window_paths, window_prepared,
+                                             batch_size, sharpen_arrays, gated, min_confidence):
+                        emit(row)
+                    progress.update(len(window_paths))
+                    window_paths, window_prepared = [], []
+
+    else:
+        # Loop through the images with tqdm progress bar
+        for file_path, prepared in tqdm(prefetch(file_paths, prepare, prefetch_depth, PREFETCH_WORKERS),
+                                        total=len(file_paths), desc="Processing Images", unit="image"):
+            filename = os.path.basename(file_path)
+            if isinstance(prepared, Exception):
+                print(f"Error processing {filename}: {prepared}")
+                emit([file_path, "Error during OCR", 0, None, "Error during sharpening", 0])
+                continue
+
+            # Extract text from original image (already decoded by the prefetch threads)
+            original_text, avg_confidence, confidences = perform_ocr(reader_simplified, reader_traditional,
+                                                                     prepared['ocr_input'])
+            original_word_count = len(preprocess_words(original_text))  # Calculate word count
+
+            if gated and not needs_second_pass(confidences, min_confidence):
+                # The original pass is confident enough; skip sharpening and the second OCR pass
+                emit([file_path, original_text, original_word_count, None, SECOND_PASS_SKIPPED, None])
+                continue
+
+            try:
+                sharpened, sharpened_image = sharpened_version(prepared, sharpen_arrays)
+
+                # Extract text from the sharpened image (EasyOCR reads NumPy arrays directly)
+                sharpened_text, _, _ = perform_ocr(reader_simplified, reader_traditional, sharpened)
+                sharpened_word_count = len(preprocess_words(sharpened_text))  # Calculate word count
+            except Exception as e:
+                print(f"Error processing {filename}: {e}")
+                sharpened_image = None
+                sharpened_text = "Error during sharpening"
+                sharpened_word_count = 0
+
+            emit([
+                file_path, original_text, original_word_count, sharpened_image,
+                sharpened_text, sharpened_word_count
+            ])
+
+    if gated:
+        print(f"Second passes skipped: {second_passes_skipped} of {total_images} images")
+    return data
+
+# Excel layout: headers and column widths for the OCR Results sheet
+EXCEL_HEADERS = [
+    "Original Image", "Text from Original Image", "Original Image Word Count",
+    "Sharpened Image", "Text from Sharpened Image", "Sharpened Image Word Count"
+]
+EXCEL_COLUMN_WIDTHS = {
+    'A': 30,  # Original Image
+    'B': 50,  # Text from Original Image
+    'C': 20,  # Original Image Word Count
+    'D': 30,  # Sharpened Image
+    'E': 50,  # Text from Sharpened Image
+    'F': 20,  # Sharpened Image Word Count
+}
+
+# Function to open the Excel writer for the results (streaming=True writes rows as they arrive)
+def open_excel_writer(directory, excel_filename, streaming=False, image_mode='thumbnail'):
+    excel_path = os.path.join(directory, excel_filename)
+    return ExcelResultsWriter(excel_path, EXCEL_HEADERS, EXCEL_COLUMN_WIDTHS, streaming=streaming,
+                              image_mode=image_mode)
+
+# Function to write one image's results as a row of the Excel sheet
+def write_excel_row(writer, row):
+    (original_image_path, original_text, original_word_count,
+     sharpened_image, sharpened_text, sharpened_word_count) = row
+
+    # Insert original image
+    try:
+        writer.add_image('A', original_image_path, 150, 100)  # Adjust dimensions
+    except Exception as e:
+        print(f"Error adding original image to Excel: {e}")
+
+    # Insert sharpened image if available
+    if sharpened_image:
+        try:
+            writer.add_image('D', sharpened_image, 150, 100)  # Adjust dimensions
+        except Exception as e:
+            print(f"Error adding sharpened image to Excel: {e}")
+
+    # Write text and word count from the original and sharpened images,
+    # with the row height matching the image height
+    writer.append([
+        None, original_text, original_word_count,
+        None, sharpened_text, sharpened_word_count
+    ], row_height=100 * 0.75)  # Approximate conversion from pixels to Excel row height
+
+# Function to save images and text to Excel
+def save_to_excel(directory, data, excel_filename, image_mode='thumbnail'):
+    # Create a workbook and write one row per image
+    with open_excel_writer(directory, excel_filename, image_mode=image_mode) as writer:
+        for row in data:
+            write_excel_row(writer, row)
+
+    # Save the Excel file in the images directory
+    print(f"Data has been successfully exported to {writer.path}")
+
+# Function to ask for the image directory and Excel file name, OCR the images with and without
+# sharpening and export the results (the scripts' main, with their sharpener and settings)
+def run_comparison(sharpen_arrays, batch_size=1, gated=False, min_confidence=SECOND_PASS_MIN_CONFIDENCE,
+                   profile=None, prefetch_depth=PREFETCH_DEPTH, streaming=False, image_mode='thumbnail'):
+    start_time = time.time()
+
+    directory = input("Enter the directory of your images: ").strip()
+    if not os.path.isdir(directory):
+        print("Invalid directory. Please try again.")
+        return
+
+    # Ask for the Excel file name
+    excel_filename = input("Enter the name of your Excel file (without extension): ").strip()
+    if not excel_filename:
+        excel_filename = "OCR_Results.xlsx"
+    else:
+        excel_filename += ".xlsx"
+
+    options = {'batch_size': batch_size, 'gated': gated, 'profile': profile, 'prefetch_depth': prefetch_depth,
+               'min_confidence': min_confidence}
+
+    # Extract text from images
+    if streaming:
+        # Write each image's row as soon as it is processed instead of holding everything until the end
+        with open_excel_writer(directory, excel_filename, streaming=True, image_mode=image_mode) as writer:
+            extract_text_from_images(directory, sharpen_arrays, on_result=lambda row: write_excel_row(writer, row),
+                                     **options)
+        print(f"Data has been successfully exported to {', '.join(writer.saved_paths)}")
+    else:
+        data = extract_text_from_images(directory, sharpen_arrays, **options)
+
+        # Save data to Excel
+        save_to_excel(directory, data, excel_filename, image_mode)
+
+    # End the timer
+    end_time = time.time()
+    print(f"Time taken: {end_time - start_time:.2f} seconds")
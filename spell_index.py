@@ -0,0 +1,238 @@
+"""
+Precompiled spell checking vocabulary shared by the OCR scripts.
+
+The index merges pyspellchecker's English word frequencies with domain vocabulary: the 'cas'
+token, and substance names, synonyms and CAS numbers read from lists such as the
+Fentanyl_Precursors spreadsheet. It is compiled once, pickled to disk and reloaded on later
+runs. Each language / domain vocabulary combination gets its own file (named after a hash of
+those settings), so scripts with different domain lists don't overwrite each other's index. An
+index is only rebuilt when its domain files or the pyspellchecker version change.
+
+Lookups are plain set operations. unknown() has the same semantics as SpellChecker.unknown.
+unknown_batch() checks the words of a whole batch of OCR output at once. suggest() is a
+symmetric-delete (SymSpell-style) suggestion mode: words are indexed by their single-character
+deletes, so candidates come from a handful of dictionary lookups instead of generating every
+possible edit of the misspelled word.
+"""
+import hashlib
+import os
+import pickle
+import re
+import string
+
+# Default index location, next to the OCR cache: <prefix>_<settings hash>.pickle
+DEFAULT_INDEX_PREFIX = os.path.join(os.path.expanduser('~'), '.gru_spell_index')
+
+# Bump when the index format or the way domain files are read changes
+INDEX_VERSION = 1
+
+# Domain words that are always known
+DEFAULT_DOMAIN_WORDS = ('cas',)
+
+# Suggestions are found within this edit distance, using only the first PREFIX_LENGTH characters
+# of each word to keep the delete index small
+MAX_EDIT_DISTANCE = 1
+PREFIX_LENGTH = 7
+
+# CAS registry numbers, e.g. 79099-07-3 (validated by their check digit)
+CAS_NUMBER = re.compile(r'^(\d{2,7})-(\d{2})-(\d)$')
+
+
+# Function to tell whether a token is a CAS registry number with a valid check digit
+def is_cas_number(token):
+    match = CAS_NUMBER.match(token)
+    if not match:
+        return False
+    digits = (match.group(1) + match.group(2))[::-1]
+    return sum((i + 1) * int(d) for i, d in enumerate(digits)) % 10 == int(match.group(3))
+
+
+# Function to split a vocabulary entry (e.g. "N-Phenethyl-4-piperidone") into the tokens OCR output
+# is checked against: each word, the word without punctuation and its punctuation-separated parts
+def vocabulary_tokens(entry):
+    tokens = set()
+    for word in str(entry).lower().split():
+        tokens.add(word)
+        tokens.add(re.sub(r'[^\w\s]', '', word))
+        tokens.update(re.split(r'[^\w]+', word))
+    tokens.discard('')
+    return tokens
+
+
+# Function to read the vocabulary entries from a domain file: a spreadsheet or CSV with Substance,
+# Synonyms (';'-separated) and/or CAS columns, or a text file with one entry per line
+def read_domain_entries(path):
+    if path.lower().endswith(('.txt', '.lst')):
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    import pandas as pd
+    df = pd.read_csv(path) if path.lower().endswith('.csv') else pd.read_excel(path)
+    entries = []
+    for column in df.columns:
+        name = str(column).strip().lower()
+        if name == 'substance' or 'cas' in name.split():
+            entries.extend(df[column].dropna().astype(str))
+        elif name == 'synonyms':
+            entries.extend(df[column].dropna().astype(str).str.split(';').explode().str.strip())
+    return entries
+
+
+# Function to compute the optimal string alignment (Damerau-Levenshtein) distance between two words,
+# giving up early once it exceeds max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+# Function to list the strings within MAX_EDIT_DISTANCE deletes of a word's prefix
+def _deletes(word):
+    prefix = word[:PREFIX_LENGTH]
+    deletes = {prefix}
+    for _ in range(MAX_EDIT_DISTANCE):
+        deletes |= {w[:i] + w[i + 1:] for w in deletes for i in range(len(w))}
+    return deletes
+
+
+class SpellIndex:
+    """Known words (with their frequencies) plus a lazily built symmetric-delete suggestion index."""
+
+    def __init__(self, frequencies, longest_word_length=None):
+        self.frequencies = frequencies
+        self.longest_word_length = longest_word_length or max(map(len, frequencies), default=0)
+        self._delete_index = None
+
+    # Same filter as SpellChecker: skip lone punctuation, absurdly long tokens and numbers
+    def _should_check(self, word):
+        if len(word) == 1 and word in string.punctuation:
+            return False
+        if len(word) > self.longest_word_length + 3:
+            return False
+        if word.lower() in ('nan', 'inf', 'infinity'):
+            return True
+        try:
+            float(word)
+            return False
+        except ValueError:
+            return not is_cas_number(word)
+
+    def __contains__(self, word):
+        return word.lower() in self.frequencies or is_cas_number(word)
+
+    def unknown(self, words):
+        """Return the (lowercased) words that are not in the vocabulary."""
+        return {w for w in (w.lower() for w in words if self._should_check(w)) if w not in self.frequencies}
+
+    def unknown_batch(self, word_lists):
+        """Return unknown() for each list of words, looking every distinct word up only once."""
+        word_lists = [[w.lower() for w in words if self._should_check(w)] for words in word_lists]
+        unknown_words = set().union(*word_lists) - self.frequencies.keys()
+        return [unknown_words.intersection(words) for words in word_lists]
+
+    def suggest(self, word, max_suggestions=5):
+        """Return up to max_suggestions known words within MAX_EDIT_DISTANCE edits, closest and most frequent first."""
+        word = word.lower()
+        if word in self.frequencies:
+            return [word]
+        if self._delete_index is None:
+            self._delete_index = {}
+            for known in self.frequencies:
+                for delete in _deletes(known):
+                    self._delete_index.setdefault(delete, []).append(known)
+
+        candidates = set()
+        for delete in _deletes(word):
+            candidates.update(self._delete_index.get(delete, ()))
+        scored = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, MAX_EDIT_DISTANCE)
+            if distance <= MAX_EDIT_DISTANCE:
+                scored.append((distance, -self.frequencies[candidate], candidate))
+        return [candidate for _, _, candidate in sorted(scored)[:max_suggestions]]
+
+    def correction(self, word):
+        """Return the best suggestion for a word, or the word itself if there is none."""
+        suggestions = self.suggest(word, 1)
+        return suggestions[0] if suggestions else word.lower()
+
+
+# Function to describe the index inputs, so a saved index is rebuilt when any of them changes
+def _signature(language, domain_files, domain_words):
+    import spellchecker
+    files = []
+    for path in domain_files:
+        stat = os.stat(path)
+        files.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return (INDEX_VERSION, getattr(spellchecker, '__version__', None), language, tuple(files),
+            tuple(sorted(domain_words)))
+
+
+# Function to name the default index file after the settings it was built from (the file versions are
+# left to the staleness check, so an edited domain file rebuilds its index in place)
+def default_index_path(language='en', domain_files=(), domain_words=DEFAULT_DOMAIN_WORDS):
+    settings = repr((language, tuple(os.path.abspath(path) for path in domain_files), tuple(sorted(domain_words))))
+    return f"{DEFAULT_INDEX_PREFIX}_{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]}.pickle"
+
+
+# Function to compile the index from pyspellchecker's dictionary and the domain vocabulary
+def build_spell_index(language='en', domain_files=(), domain_words=DEFAULT_DOMAIN_WORDS):
+    from spellchecker import SpellChecker
+    frequencies = dict(SpellChecker(language=language).word_frequency.dictionary)
+    domain_tokens = set()
+    for entry in domain_words:
+        domain_tokens |= vocabulary_tokens(entry)
+    for path in domain_files:
+        for entry in read_domain_entries(path):
+            domain_tokens |= vocabulary_tokens(entry)
+    for token in domain_tokens:
+        frequencies.setdefault(token, 1)
+    return SpellIndex(frequencies)
+
+
+# Function to load the compiled index from path (by default the file for these settings), (re)building
+# and saving it if it is missing or stale
+def load_spell_index(path=None, language='en', domain_files=(), domain_words=DEFAULT_DOMAIN_WORDS):
+    if path is None:
+        path = default_index_path(language, domain_files, domain_words)
+    signature = _signature(language, domain_files, domain_words)
+    try:
+        with open(path, 'rb') as f:
+            saved_signature, frequencies, longest_word_length = pickle.load(f)
+        if saved_signature == signature:
+            return SpellIndex(frequencies, longest_word_length)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    index = build_spell_index(language, domain_files, domain_words)
+    try:
+        # Write to a temporary file first so a concurrent reader never sees half an index
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump((signature, index.frequencies, index.longest_word_length), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Could not save the spell index to {path}: {e}")
+    return index
+
+
+_default_indexes = {}
+
+
+# Function to get this process's shared index for a language and domain files, loading it on first use
+def get_spell_index(language='en', domain_files=()):
+    key = (language, tuple(domain_files))
+    if key not in _default_indexes:
+        _default_indexes[key] = load_spell_index(language=language, domain_files=domain_files)
+    return _default_indexes[key]
@@ -0,0 +1,165 @@
+"""
+Chunked, resumable processing of large spreadsheets.
+
+iter_spreadsheet_chunks reads an .xlsx (openpyxl read-only mode) or .csv file a fixed number
+of rows at a time, so only one chunk is ever held as a DataFrame. Each processed chunk is
+saved to a ChunkCheckpoint directory next to the output as soon as it is done, together with
+a checkpoint file recording how many chunks are complete, the input file's size and
+modification time and the run settings. Re-running over the same input skips the completed
+chunks; if the input or the settings changed, the run starts over. write_chunks_to_excel /
+write_chunks_to_csv then stream the saved chunks into the final output one at a time.
+"""
+import glob
+import json
+import os
+from itertools import islice
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 5000
+
+# Rows per worksheet in an .xlsx file (the header takes one)
+EXCEL_MAX_ROWS = 1048575
+
+CHECKPOINT_FILENAME = 'checkpoint.json'
+
+
+# Function to name unnamed header cells the way pandas does
+def _column_names(header):
+    return [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+
+
+# Function to yield the header and then the data rows of an .xlsx file's first sheet
+def _iter_excel_rows(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        yield _column_names(next(rows, ()))
+        yield from rows
+    finally:
+        wb.close()
+
+
+def iter_spreadsheet_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS, skip_chunks=0):
+    """Yield (chunk number, DataFrame) for successive chunk_rows-row chunks of the file.
+
+    Each DataFrame is indexed by row position in the whole file, as pd.read_excel would index it.
+    The first skip_chunks chunks are read past without being turned into DataFrames.
+    """
+    skipped = skip_chunks * chunk_rows
+    if path.lower().endswith('.csv'):
+        reader = pd.read_csv(path, chunksize=chunk_rows, skiprows=range(1, skipped + 1))
+        for number, df in enumerate(reader, skip_chunks):
+            start = number * chunk_rows
+            yield number, df.set_axis(range(start, start + len(df)))
+        return
+
+    rows = _iter_excel_rows(path)
+    columns = next(rows)
+    for _ in islice(rows, skipped):
+        pass
+    number = skip_chunks
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        start = number * chunk_rows
+        yield number, pd.DataFrame.from_records(chunk, columns=columns, index=range(start, start + len(chunk)))
+        number += 1
+
+
+# Function to write a file in one step, so an interrupted run never leaves half of one behind
+def _write_atomic(path, write):
+    write(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+class ChunkCheckpoint:
+    """Directory of finished chunks (pickled DataFrames) plus a record of how far the run got."""
+
+    def __init__(self, directory, input_path, settings):
+        self.directory = directory
+        stat = os.stat(input_path)
+        # Size and modification time identify the version of the input that was processed
+        self.state = {'input': os.path.abspath(input_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                      'settings': json.loads(json.dumps(settings)), 'completed': 0}
+        self._load()
+
+    # Pick up an earlier run over the same input and settings; otherwise start from scratch
+    def _load(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILENAME)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if all(saved.get(name) == self.state[name] for name in ('input', 'size', 'mtime_ns', 'settings')):
+                self.state = saved
+                return
+        self.clear()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def completed(self):
+        """Number of chunks finished so far (chunks are always completed in order)."""
+        return self.state['completed']
+
+    def _chunk_path(self, number):
+        return os.path.join(self.directory, f'chunk_{number:06d}.pkl')
+
+    def save_chunk(self, number, df):
+        """Save a finished chunk, then mark it (and every chunk before it) as completed."""
+        if number != self.completed:
+            raise ValueError(f"Chunk {number} finished out of order; expected chunk {self.completed}")
+        _write_atomic(self._chunk_path(number), df.to_pickle)
+        self.state['completed'] = number + 1
+        _write_atomic(os.path.join(self.directory, CHECKPOINT_FILENAME), self._write_state)
+
+    def _write_state(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+
+    def iter_chunks(self):
+        """Yield the completed chunks' DataFrames in order, loading one at a time."""
+        for number in range(self.completed):
+            yield pd.read_pickle(self._chunk_path(number))
+
+    def clear(self):
+        """Delete the saved chunks and the checkpoint."""
+        for path in glob.glob(os.path.join(self.directory, 'chunk_*.pkl*')):
+            os.remove(path)
+        checkpoint_path = os.path.join(self.directory, CHECKPOINT_FILENAME)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        if os.path.isdir(self.directory) and not os.listdir(self.directory):
+            os.rmdir(self.directory)
+        self.state['completed'] = 0
+
+
+# Function to turn missing values into empty cells
+def _cell(value):
+    return None if not isinstance(value, str) and pd.isna(value) else value
+
+
+# Function to stream DataFrame chunks into one .xlsx file laid out like DataFrame.to_excel (index first)
+def write_chunks_to_excel(chunks, output_path, sheet_title='Sheet1'):
+    from excel_export import ExcelResultsWriter
+    writer = None
+    for df in chunks:
+        if writer is None:
+            writer = ExcelResultsWriter(output_path, [None] + list(df.columns), sheet_title=sheet_title,
+                                        streaming=True, max_rows=EXCEL_MAX_ROWS)
+        for row in df.itertuples(name=None):
+            writer.append([_cell(value) for value in row])
+    if writer is not None:
+        writer.save()
+        return writer.saved_paths
+    return []
+
+
+# Function to stream DataFrame chunks into one .csv file, as DataFrame.to_csv would write them
+def write_chunks_to_csv(chunks, output_path):
+    def write(path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for number, df in enumerate(chunks):
+                df.to_csv(f, header=number == 0)
+    _write_atomic(output_path, write)
+    return [output_path]
@@ -0,0 +1,181 @@
+"""
+Pool of long-lived Tesseract workers shared by the PyTesseract scripts.
+
+pytesseract.image_to_string starts a new tesseract process for every call, which reloads the
+traineddata and round-trips the image through temp files. On small screenshots that startup
+cost dominates. Each TesseractWorker here is one Python process that loads the language model
+once (through tesserocr's in-process API when it is installed) and then reads raw image buffers
+from a pipe and writes the recognized text back.
+
+Without tesserocr the workers fall back to pytesseract, so the scripts still run (just without
+the speed-up). Install it with `pip install tesserocr`.
+"""
+import atexit
+import os
+import pickle
+import queue
+import struct
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Image modes sent to the workers as-is; anything else is converted to RGB first
+RAW_MODES = ('1', 'L', 'RGB', 'RGBA')
+
+# Workers in the per-process default pool (see get_default_pool)
+DEFAULT_POOL_SIZE = 1
+
+_HEADER = struct.Struct('>I')
+
+
+# Function to write one length-prefixed pickled message to a pipe
+def _send(pipe, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    pipe.write(_HEADER.pack(len(data)))
+    pipe.write(data)
+    pipe.flush()
+
+
+# Function to read one length-prefixed pickled message from a pipe (None at end of stream)
+def _receive(pipe):
+    header = pipe.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return pickle.loads(pipe.read(length))
+
+
+class TesseractWorker:
+    """One long-lived Tesseract process that keeps its language model loaded between images."""
+
+    def __init__(self, lang='eng', tesseract_cmd=None):
+        self.lang = lang
+        self.tesseract_cmd = tesseract_cmd
+        self.process = None
+
+    def _start(self):
+        command = [sys.executable, os.path.abspath(__file__), self.lang]
+        if self.tesseract_cmd:
+            command.append(self.tesseract_cmd)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def image_to_string(self, image):
+        """Return the text Tesseract reads from a PIL image."""
+        if image.mode not in RAW_MODES:
+            image = image.convert('RGB')
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+
+        try:
+            _send(self.process.stdin, (image.mode, image.size, image.tobytes()))
+            reply = _receive(self.process.stdout)
+        except (BrokenPipeError, OSError):
+            reply = None
+        if reply is None:
+            # The worker died (e.g. Tesseract crashed on this image); start a fresh one next time
+            self.close()
+            raise RuntimeError("Tesseract worker exited unexpectedly")
+
+        status, value = reply
+        if status == 'error':
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+class TesseractPool:
+    """Thread-safe pool of TesseractWorkers; image_to_string uses whichever worker is free."""
+
+    def __init__(self, workers=None, lang='eng', tesseract_cmd=None):
+        self.workers = [TesseractWorker(lang, tesseract_cmd) for _ in range(workers or os.cpu_count() or 1)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def image_to_string(self, image):
+        """Return the text Tesseract reads from a PIL image."""
+        worker = self._idle.get()
+        try:
+            return worker.image_to_string(image)
+        finally:
+            self._idle.put(worker)
+
+    def map(self, images):
+        """Return the text for each image, in order, OCRing up to one image per worker at a time."""
+        with ThreadPoolExecutor(max_workers=len(self.workers)) as executor:
+            return list(executor.map(self.image_to_string, images))
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_pools = {}
+
+
+# Function to get this process's shared pool for a language, starting it on first use
+def get_default_pool(lang='eng', tesseract_cmd=None):
+    if lang not in _default_pools:
+        _default_pools[lang] = TesseractPool(DEFAULT_POOL_SIZE, lang, tesseract_cmd)
+    return _default_pools[lang]
+
+
+@atexit.register
+def _close_default_pools():
+    for pool in _default_pools.values():
+        pool.close()
+
+
+# Worker side: load the model once, then answer requests until the pipe is closed
+def _worker_main(lang, tesseract_cmd=None):
+    requests, replies = sys.stdin.buffer, sys.stdout.buffer
+    # Keep stray prints (and library warnings) from corrupting the reply stream
+    sys.stdout = sys.stderr
+
+    try:
+        from tesserocr import PyTessBaseAPI
+        api = PyTessBaseAPI(lang=lang)
+    except ImportError:
+        import pytesseract
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        api = None
+
+    while True:
+        request = _receive(requests)
+        if request is None:
+            break
+        mode, size, data = request
+        try:
+            image = Image.frombytes(mode, size, data)
+            if api is not None:
+                api.SetImage(image)
+                text = api.GetUTF8Text()
+            else:
+                text = pytesseract.image_to_string(image, lang=lang)
+            _send(replies, ('ok', text))
+        except Exception as e:
+            _send(replies, ('error', str(e)))
+
+    if api is not None:
+        api.End()
+
+
+if __name__ == '__main__':
+    _worker_main(*sys.argv[1:])
@@ -0,0 +1,51 @@
+"""
+Resuming an EasyOCR run from its manifest: finished images are re-used, failed ones are retried.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('easyocr')
+
+import EasyOCR
+from run_manifest import MANIFEST_FILENAME, RunManifest
+
+
+# Function to stand in for process_image, failing for the file names in fail_on and logging every call
+def fake_process_image(calls, fail_on):
+    def process_image(reader_simplified, reader_traditional, spell, file_path, *args):
+        filename = os.path.basename(file_path)
+        calls.append(filename)
+        stats = EasyOCR.new_image_stats()
+        if filename in fail_on:
+            stats['failed_extractions'] = 1
+            return {'filename': filename, 'extracted_text': "Error in OCR"}, stats
+        stats['images_with_text'] = 1
+        return {'filename': filename, 'extracted_text': filename}, stats
+    return process_image
+
+
+def run(directory, monkeypatch, fail_on=()):
+    calls = []
+    monkeypatch.setattr(EasyOCR, 'build_readers', lambda: (None, None))
+    monkeypatch.setattr(EasyOCR, 'get_spell_index', lambda language, domain_files: set())
+    monkeypatch.setattr(EasyOCR, 'process_image', fake_process_image(calls, set(fail_on)))
+    with RunManifest(os.path.join(directory, MANIFEST_FILENAME), EasyOCR.OCR_SETTINGS) as manifest:
+        data, metrics, _ = EasyOCR.extract_text_from_images(directory, manifest=manifest)
+    return sorted(calls), metrics
+
+
+def test_failed_image_is_retried_on_resume(tmp_path, monkeypatch):
+    for name in ('a.png', 'b.png', 'c.png'):
+        (tmp_path / name).write_bytes(b'image')
+
+    calls, metrics = run(str(tmp_path), monkeypatch, fail_on={'b.png'})
+    assert calls == ['a.png', 'b.png', 'c.png']
+    assert metrics.value('failed_extractions') == 1
+
+    # Only the failed image is OCRed again; the finished ones come from the manifest
+    calls, metrics = run(str(tmp_path), monkeypatch)
+    assert calls == ['b.png']
+    assert metrics.value('images_resumed') == 2
+    assert metrics.value('failed_extractions') == 0
+    assert metrics.value('images_with_text') == 3
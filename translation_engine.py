@@ -0,0 +1,207 @@
+"""
+Deduplicated, batched and concurrent translation of DataFrame text columns.
+
+Search-result exports repeat the same strings many times over (every result row carries its
+Query). TranslationEngine collects the distinct strings across all the requested columns,
+translates each one once, in batches of batch_size strings worked on by at most max_workers
+threads, and maps the translations back onto every row. Run time scales with the
+number of unique strings instead of rows x columns.
+
+Before anything is looked up, each column is run through a vectorized prefilter: only cells
+containing Chinese (Han) characters, at least min_cjk_ratio of their non-space characters, are
+translated. Cells that are already English, numbers or URLs are left as they are and counted
+as skipped.
+
+With a TranslationMemory (see translation_memory.py) segments translated in earlier runs are
+looked up first, and only the rest are sent to the translator. Strings are deduplicated by
+their normalized form, the same key the memory uses.
+
+The translator comes from translator_factory (googletrans' Translator by default), called
+once per worker thread. googletrans' list translate is only a loop of one HTTP request per
+string, so by default each string of a batch is translated on its own and a failure (e.g. a
+rate limit) costs just that string; with list_requests=True (the local Marian model) a batch
+goes to the translator as one list call. Any object with googletrans' translate(text_or_list, src=, dest=)
+interface works, so the engine can be run against a local fake translator. create_engine
+picks a backend by name: 'googletrans' (online) or 'marian' (a local model on the CPU, see
+marian_translator.py).
+"""
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from translation_memory import normalize_segment
+
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_MAX_WORKERS = 4
+
+# The local model gets large requests, which it length-sorts into its own inference batches, from a
+# single worker: PyTorch already spreads each batch over the CPU threads
+MARIAN_BATCH_SIZE = 256
+MARIAN_MAX_WORKERS = 1
+
+BACKENDS = ('googletrans', 'marian')
+
+# Han ideographs (CJK Unified Ideographs, Extension A and Compatibility Ideographs)
+CJK_PATTERN = r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]'
+
+# Share of a cell's non-space characters that must be Han for it to be translated; 0 translates any
+# cell with at least one, None turns the prefilter off
+DEFAULT_MIN_CJK_RATIO = 0.0
+
+
+# Function to check whether a column holds any strings, so its .str accessor can be used (pandas refuses
+# it on object columns without strings, e.g. only booleans in a chunk read by spreadsheet_stream.py)
+def has_strings(series):
+    return pd.api.types.infer_dtype(series, skipna=True) in ('string', 'mixed', 'mixed-integer')
+
+
+# Function to mark the cells of a column that contain enough Chinese text to need translating
+def needs_translation(series, min_cjk_ratio=DEFAULT_MIN_CJK_RATIO):
+    if not has_strings(series):
+        return pd.Series(False, index=series.index)
+    # Non-string cells give NaN counts, which compare as False
+    cjk = series.str.count(CJK_PATTERN)
+    visible = series.str.count(r'\S')
+    return ((cjk > 0) & (cjk >= visible * min_cjk_ratio)).fillna(False).astype(bool)
+
+
+# Function to mark the cells of a column that hold non-blank text
+def text_cells(series):
+    if not has_strings(series):
+        return pd.Series(False, index=series.index)
+    return (series.str.count(r'\S') > 0).fillna(False).astype(bool)
+
+
+# Function to create the default translator (googletrans is only needed when it is used)
+def google_translator():
+    from googletrans import Translator
+    return Translator()
+
+
+class TranslationEngine:
+    """Translates each distinct string once, in batches worked on by a bounded thread pool."""
+
+    def __init__(self, src='zh-cn', dest='en', batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 translator_factory=google_translator, memory=None, backend='googletrans',
+                 min_cjk_ratio=DEFAULT_MIN_CJK_RATIO, list_requests=False):
+        self.src = src
+        self.dest = dest
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.translator_factory = translator_factory
+        # Translation memory consulted before the translator, and the backend name its entries are stored under
+        self.memory = memory
+        self.backend = backend
+        self.min_cjk_ratio = min_cjk_ratio
+        # Whether a batch is sent as one translate(list) call, or one call per string
+        self.list_requests = list_requests
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Totals for the summary line: cells seen, text cells the prefilter skipped, distinct strings, strings
+        # found in the translation memory, translator calls made, failed strings, strings translated and the seconds
+        # spent translating them
+        self.stats = {'cells': 0, 'skipped': 0, 'unique': 0, 'memory_hits': 0, 'requests': 0, 'errors': 0,
+                      'translated': 0, 'seconds': 0.0}
+
+    @property
+    def sentences_per_second(self):
+        return self.stats['translated'] / self.stats['seconds'] if self.stats['seconds'] else 0.0
+
+    # Each worker thread gets its own translator (and with it its own HTTP session)
+    def _translator(self):
+        if not hasattr(self._local, 'translator'):
+            self._local.translator = self.translator_factory()
+        return self._local.translator
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _translate_one(self, text):
+        self._count('requests')
+        try:
+            return self._translator().translate(text, src=self.src, dest=self.dest).text
+        except Exception as e:
+            print(f"Translation error: {e}")
+            self._count('errors')
+            return None
+
+    def translate_batch(self, texts):
+        """Translate a list of strings, returning their translations in order (None for failures)."""
+        if not self.list_requests:
+            # Each string is its own call, so a failure only costs that string and nothing is sent twice
+            return [self._translate_one(text) for text in texts]
+
+        self._count('requests')
+        try:
+            translations = self._translator().translate(list(texts), src=self.src, dest=self.dest)
+            return [translation.text for translation in translations]
+        except Exception as e:
+            # One bad string should not cost the whole batch
+            print(f"Batch translation error, retrying one at a time: {e}")
+            return [self._translate_one(text) for text in texts]
+
+    def translate_unique(self, texts):
+        """Return a {text: translation} dict covering every distinct non-blank string in texts."""
+        segments = {}  # Original string -> normalized segment
+        for text in texts:
+            if isinstance(text, str) and text not in segments and text.strip():
+                segments[text] = normalize_segment(text)
+        unique = list(dict.fromkeys(segments.values()))
+        self._count('unique', len(unique))
+
+        # Segments translated in earlier runs come from the translation memory
+        translated = {}
+        if self.memory is not None:
+            translated = self.memory.get_many(unique, self.src, self.dest, self.backend)
+            self._count('memory_hits', len(translated))
+        missing = [segment for segment in unique if segment not in translated]
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch, results in zip(batches, executor.map(self.translate_batch, batches)):
+                # Failed strings (None) are left out, so they keep their original text and are retried next run
+                batch_translations = {segment: result for segment, result in zip(batch, results) if result is not None}
+                # Store each batch as it finishes, so an interrupted run keeps what it already paid for
+                if self.memory is not None:
+                    self.memory.put_many(batch_translations, self.src, self.dest, self.backend)
+                translated.update(batch_translations)
+                self._count('translated', len(batch_translations))
+        self._count('seconds', time.perf_counter() - start)
+
+        return {text: translated[segment] for text, segment in segments.items() if segment in translated}
+
+    def translate_columns(self, df, columns):
+        """Translate the given columns of df in place (cells that are not Chinese text are left as they are)."""
+        self._count('cells', len(df) * len(columns))
+        texts = []
+        for column in columns:
+            values = df[column]
+            if self.min_cjk_ratio is not None:
+                mask = needs_translation(values, self.min_cjk_ratio)
+                self._count('skipped', int((text_cells(values) & ~mask).sum()))
+                values = values[mask]
+            texts.extend(values)
+        translations = self.translate_unique(texts)
+        for column in columns:
+            df[column] = df[column].map(lambda value: translations.get(value, value) if isinstance(value, str)
+                                        else value)
+        return df
+
+
+# Function to create an engine for a backend: 'googletrans' or 'marian' (model is a model name or a
+# local model directory, threads the PyTorch CPU threads); batch_size/max_workers default per backend
+def create_engine(backend='googletrans', src='zh-cn', dest='en', batch_size=None, max_workers=None, memory=None,
+                  model=None, threads=None, min_cjk_ratio=DEFAULT_MIN_CJK_RATIO):
+    if backend == 'googletrans':
+        return TranslationEngine(src, dest, batch_size or DEFAULT_BATCH_SIZE, max_workers or DEFAULT_MAX_WORKERS,
+                                 google_translator, memory, 'googletrans', min_cjk_ratio)
+    if backend == 'marian':
+        from marian_translator import DEFAULT_MODEL, MarianTranslator
+        translator = MarianTranslator(model or DEFAULT_MODEL, num_threads=threads)
+        # Every worker shares the one loaded model; memory entries are kept per model
+        return TranslationEngine(src, dest, batch_size or MARIAN_BATCH_SIZE, max_workers or MARIAN_MAX_WORKERS,
+                                 lambda: translator, memory, f'marian:{translator.model_name}', min_cjk_ratio,
+                                 list_requests=True)
+    raise ValueError(f"Unknown translation backend {backend!r}; expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,144 @@
+"""
+Persistent translation memory shared by the translation runs.
+
+Every translated segment is stored once, keyed by its normalized source text (Unicode NFKC,
+whitespace collapsed), the language pair and the translation backend. TranslationEngine looks
+segments up here before calling any translator, so re-translating a file that overlaps an
+earlier one (consecutive search-result exports share most Titles and Snippets) only pays for
+the new segments.
+
+Like the OCR cache, the memory is a single SQLite file, looked up and written in bulk, and the
+least recently used segments are evicted once the stored text grows past max_bytes. The total
+size is kept as a running count in a one-row table, updated in the same transaction as each
+write, so storing a batch never has to add up the whole table.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+# Default memory location, next to the OCR cache
+DEFAULT_MEMORY_PATH = os.path.join(os.path.expanduser('~'), '.gru_translation_memory.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB of stored segments
+
+# Keys per SELECT ... IN (...) query, below SQLite's bound-parameter limit
+_LOOKUP_CHUNK = 500
+
+
+# Function to normalize a segment so trivially different copies (full-width characters, extra
+# or different whitespace) share one memory entry
+def normalize_segment(text):
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+# Function to build a memory key from the normalized segment, language pair and backend
+def make_segment_key(segment, src, dest, backend):
+    settings = f"{backend}|{src}|{dest}|{normalize_segment(segment)}"
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """SQLite-backed translation memory with bulk lookup, a size limit and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, max_bytes=DEFAULT_MAX_BYTES, timeout=30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS segments ('
+                         'key TEXT PRIMARY KEY, source TEXT NOT NULL, translation TEXT NOT NULL, '
+                         'size INTEGER NOT NULL, last_access REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS segments_last_access ON segments (last_access)')
+            # Running total of the stored sizes (seeded from the table the first time, e.g. for an older memory)
+            conn.execute('CREATE TABLE IF NOT EXISTS memory_meta ('
+                         'id INTEGER PRIMARY KEY CHECK (id = 0), total_size INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO memory_meta (id, total_size) '
+                         'SELECT 0, COALESCE(SUM(size), 0) FROM segments')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, segments, src, dest, backend):
+        """Return {segment: translation} for the given segments that are in the memory."""
+        keys = {make_segment_key(segment, src, dest, backend): segment for segment in segments}
+        found = {}
+        conn = self._connect()
+        with conn:
+            key_list = list(keys)
+            for start in range(0, len(key_list), _LOOKUP_CHUNK):
+                chunk = key_list[start:start + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f'SELECT key, translation FROM segments WHERE key IN ({placeholders})',
+                                    chunk).fetchall()
+                for key, translation in rows:
+                    found[keys[key]] = translation
+                # Only hits are touched, so a lookup that finds nothing doesn't write
+                if rows:
+                    hit_keys = [key for key, _ in rows]
+                    hit_placeholders = ','.join('?' * len(hit_keys))
+                    conn.execute(f'UPDATE segments SET last_access = ? WHERE key IN ({hit_placeholders})',
+                                 [time.time()] + hit_keys)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, translations, src, dest, backend):
+        """Store {segment: translation} pairs and evict old segments if over the size limit."""
+        now = time.time()
+        rows = {}  # By key, so segments that normalize to the same text are counted once
+        for segment, translation in translations.items():
+            source = normalize_segment(segment)
+            size = len(source.encode('utf-8')) + len(translation.encode('utf-8'))
+            key = make_segment_key(segment, src, dest, backend)
+            rows[key] = (key, source, translation, size, now)
+        if not rows:
+            return
+        conn = self._connect()
+        with conn:
+            # Keep the running total in step: take off the segments being replaced, add the new ones
+            key_list = list(rows)
+            for start in range(0, len(key_list), _LOOKUP_CHUNK):
+                chunk = key_list[start:start + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                conn.execute('UPDATE memory_meta SET total_size = total_size - '
+                             f'(SELECT COALESCE(SUM(size), 0) FROM segments WHERE key IN ({placeholders}))', chunk)
+            conn.executemany('INSERT OR REPLACE INTO segments (key, source, translation, size, last_access) '
+                             'VALUES (?, ?, ?, ?, ?)', list(rows.values()))
+            conn.execute('UPDATE memory_meta SET total_size = total_size + ?',
+                         (sum(row[3] for row in rows.values()),))
+            self._evict(conn)
+
+    # Delete least recently used segments until the memory fits in max_bytes
+    def _evict(self, conn):
+        total = conn.execute('SELECT total_size FROM memory_meta').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale_keys, freed = [], 0
+        for key, size in conn.execute('SELECT key, size FROM segments ORDER BY last_access'):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM segments WHERE key = ?', stale_keys)
+        conn.execute('UPDATE memory_meta SET total_size = total_size - ?', (freed,))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()